@@ -1,7 +1,11 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
 from database.db import engine, Base
+import asyncio
 import os
 
 from models.restaurant import Restaurant
@@ -17,6 +21,10 @@ from models.game import Game, GamePlayer
 from models.customer import Customer
 from models.customer_stats import CustomerStats
 from models.loyalty import LoyaltyProgram, CustomerLoyalty
+from models.idempotency import IdempotencyKey
+from models.balance import SessionBalance
+from models.split import BillSplit, SplitShare
+from models.service_call import ServiceCall
 
 from routes.restaurant import router as restaurant_router
 from routes.auth import router as auth_router
@@ -34,9 +42,58 @@ from routes.leaderboard import router as leaderboard_router
 from routes.loyalty import router as loyalty_router
 from routes.auto_order import router as auto_order_router
 
+from services.mqtt import start_mqtt_subscriber
+from services.coaster_state import start_coaster_flusher
+from services.ingest import start_status_promoter
+from services.weight_history import start_history_flusher
+from services.sensor_health import start_health_sweeper
+from services.dashboard import start_dashboard_feed
+from services.service_queue import start_service_sweeper
+from services.bus import start_event_bus
+from services.qr import qr_cache
+
 Base.metadata.create_all(bind=engine)
+# create_all legt Indizes nur mit neuen Tabellen an, bestehende Datenbanken nachrüsten
+for index in ServiceCall.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
+# create_all ergänzt auch keine Spalten: Bierdeckel.last_reading_at nachrüsten
+# (bestehende Bierdeckel gelten bis zur nächsten Messung als "nie gemessen")
+if "last_reading_at" not in {c["name"] for c in inspect(engine).get_columns("bierdeckel")}:
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE bierdeckel ADD COLUMN last_reading_at DATETIME"))
+    except OperationalError:
+        # Ein anderer Worker war schneller
+        if "last_reading_at" not in {c["name"] for c in inspect(engine).get_columns("bierdeckel")}:
+            raise
+# Bus-Ereignisse liegen jetzt in einer eigenen Datei (EVENT_BUS_URL), alte Tabelle entfernen
+if "bus_events" in inspect(engine).get_table_names():
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS bus_events"))
+
+# Hintergrund-Tasks (Event-Bus, MQTT, Flush von Bierdeckel-Stand und
+# Gewichtsverlauf, verzögerte Statuswechsel, Sensor-Überwachung, Dashboard-Feed, Service-Fristen)
+# und den Prozess-Pool für QR-Codes mit der App starten und stoppen
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = [t for t in [
+        start_event_bus(),
+        start_mqtt_subscriber(),
+        start_coaster_flusher(),
+        start_status_promoter(),
+        start_history_flusher(),
+        start_health_sweeper(),
+        start_dashboard_feed(),
+        start_service_sweeper()
+    ] if t]
+    qr_cache.start_pool()
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.to_thread(qr_cache.shutdown_pool)
 
-app = FastAPI(title="Bierdeckel API")
+app = FastAPI(title="Bierdeckel API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -44,6 +101,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 # Statische Dateien für Avatare
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, String, Float, Integer, ForeignKey
+from database.db import Base
+
+# Laufender Stand pro Session: Summe der Bestellungen und der abgeschlossenen Zahlungen
+class SessionBalance(Base):
+    __tablename__ = "session_balances"
+
+    session_id = Column(String, ForeignKey("sessions.id"), primary_key=True)
+    total = Column(Float, nullable=False, default=0)
+    paid = Column(Float, nullable=False, default=0)
+    version = Column(Integer, nullable=False, default=0)  # steigt bei jeder Änderung
@@ -13,4 +13,5 @@ class Bierdeckel(Base):
     qr_code = Column(String)
     weight = Column(Float, default=0)
     status = Column(String, default="empty")
-    last_updated = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    last_updated = Column(DateTime, default=datetime.utcnow)
+    last_reading_at = Column(DateTime, nullable=True)  # erste/letzte echte Messung, None = nie gemessen
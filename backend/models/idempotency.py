@@ -0,0 +1,11 @@
+from sqlalchemy import Column, String, Text, DateTime
+from datetime import datetime
+from database.db import Base
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)  # Endpunkt + Idempotency-Key
+    request_hash = Column(String, nullable=False)
+    response = Column(Text, nullable=False)  # JSON der ersten Antwort
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
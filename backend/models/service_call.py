@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Index
+from datetime import datetime
+import uuid
+from database.db import Base
+
+class ServiceCall(Base):
+    __tablename__ = "service_calls"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    session_id = Column(String, ForeignKey("sessions.id"), nullable=False)
+    restaurant_id = Column(String, ForeignKey("restaurants.id"), nullable=False)
+    request_type = Column(String, nullable=False)
+    message = Column(String)
+    status = Column(String, default="open")  # open, in_progress, done
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Offene Anfragen pro Restaurant (Service-Queue)
+    __table_args__ = (Index("ix_service_calls_restaurant_status", "restaurant_id", "status"),)
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, String, Float, DateTime, ForeignKey
+from datetime import datetime
+import uuid
+from database.db import Base
+
+# Aufteilung einer Gruppenrechnung: wer wie viel übernimmt
+class BillSplit(Base):
+    __tablename__ = "bill_splits"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    group_id = Column(String, ForeignKey("drink_groups.id"), nullable=False)
+    session_id = Column(String, ForeignKey("sessions.id"), nullable=False)  # ausgelöst von
+    mode = Column(String, nullable=False)  # even, per_item, custom
+    total = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class SplitShare(Base):
+    __tablename__ = "split_shares"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    split_id = Column(String, ForeignKey("bill_splits.id"), nullable=False)
+    session_id = Column(String, ForeignKey("sessions.id"), nullable=False)  # zahlt
+    amount = Column(Float, nullable=False)
@@ -5,6 +5,7 @@ from typing import Optional
 from database.db import get_db
 from models.session import TableSession
 from models.menu import MenuItem
+from services.auto_order_index import auto_order_index, AUTO_ORDER_SOURCES
 
 router = APIRouter()
 
@@ -48,6 +49,14 @@ def toggle_auto_order(session_id: str, data: AutoOrderToggle, db: Session = Depe
         session.auto_order_item_id = data.menu_item_id
         db.commit()
 
+        from models.order import Order
+        open_order = db.query(Order).filter(
+            Order.session_id == session_id,
+            Order.source.in_(AUTO_ORDER_SOURCES),
+            Order.status.in_(["pending", "preparing"])
+        ).first() is not None
+        auto_order_index.enable(session, menu_item, open_order)
+
         return {
             "message": f"Auto-Bestellung aktiviert: {menu_item.name}",
             "auto_order": True,
@@ -58,6 +67,7 @@ def toggle_auto_order(session_id: str, data: AutoOrderToggle, db: Session = Depe
         session.auto_order = False
         session.auto_order_item_id = None
         db.commit()
+        auto_order_index.disable(session_id)
 
         return {
             "message": "Auto-Bestellung deaktiviert",
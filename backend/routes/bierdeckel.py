@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response, JSONResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from datetime import datetime
+from typing import List, Optional
 from database.db import get_db
 from models.bierdeckel import Bierdeckel
 from models.table import Table
-import qrcode
-import io
+from services.ingest import apply_weight_updates
+from services.coaster_state import coaster_store
+from services.weight_history import weight_history, MAX_BUCKETS, MIN_BUCKET
+from services.qr import qr_cache, build_qr_zip, etag_for, etag_matches
+from services.sensor_health import sensor_health
+from services.dashboard import coaster_entry, dashboard_feed
 import os
 import base64
+import time
+import uuid
 
 router = APIRouter()
 
@@ -18,16 +25,16 @@ class BierdeckelCreate(BaseModel):
 class WeightUpdate(BaseModel):
     bierdeckel_id: str
     weight: float
+    timestamp: Optional[float] = None  # Unix-Zeit der Messung (Sensor), sonst Empfangszeit
 
-def weight_to_status(weight: float) -> str:
-    if weight < 100:
-        return "no_glass"
-    elif weight < 300:
-        return "empty"
-#   elif weight < 320:
-#      return "half"
-    else:
-        return "full"
+class WeightBatch(BaseModel):
+    readings: List[WeightUpdate]
+
+MAX_BATCH_SIZE = 10000
+
+def qr_url_for(restaurant_id, bierdeckel_id):
+    frontend_url = os.environ.get("FRONTEND_URL", "http://localhost:3000")
+    return f"{frontend_url}/r/{restaurant_id}/bd/{bierdeckel_id}"
 
 # Bierdeckel erstellen (Admin)
 @router.post("/table/{table_id}/bierdeckel")
@@ -36,20 +43,19 @@ def create_bierdeckel(table_id: str, data: BierdeckelCreate, db: Session = Depen
     if not table:
         raise HTTPException(status_code=404, detail="Tisch nicht gefunden")
 
+    # ID vorab erzeugen, damit die QR-Code URL im selben Commit gespeichert wird
+    bierdeckel_id = str(uuid.uuid4())
     new_bd = Bierdeckel(
+        id=bierdeckel_id,
         label=data.label,
         table_id=table_id,
-        restaurant_id=table.restaurant_id
+        restaurant_id=table.restaurant_id,
+        qr_code=qr_url_for(table.restaurant_id, bierdeckel_id)
     )
     db.add(new_bd)
     db.commit()
-    db.refresh(new_bd)
-
-    # QR-Code URL generieren
-    frontend_url = os.environ.get("FRONTEND_URL", "http://localhost:3000")
-    qr_url = f"{frontend_url}/r/{table.restaurant_id}/bd/{new_bd.id}"
-    new_bd.qr_code = qr_url
-    db.commit()
+    coaster_store.invalidate(restaurant_id=table.restaurant_id, table_id=table_id)
+    dashboard_feed.touch_restaurant(table.restaurant_id)
 
     return {
         "id": new_bd.id,
@@ -61,126 +67,128 @@ def create_bierdeckel(table_id: str, data: BierdeckelCreate, db: Session = Depen
 # Alle Bierdeckel eines Tisches
 @router.get("/table/{table_id}/bierdeckel")
 def get_bierdeckel_by_table(table_id: str, db: Session = Depends(get_db)):
-    bierdeckel = db.query(Bierdeckel).filter(Bierdeckel.table_id == table_id).all()
-    table = db.query(Table).filter(Table.id == table_id).first()
-
     return [
         {
             "id": bd.id,
             "label": bd.label,
-            "table_number": table.table_number if table else None,
+            "table_number": bd.table_number,
             "qr_code_url": bd.qr_code,
             "weight": bd.weight,
             "status": bd.status
         }
-        for bd in bierdeckel
+        for bd in coaster_store.for_table(db, table_id)
     ]
 
 # QR-Code als Bild
 @router.get("/bierdeckel/{bierdeckel_id}/qr")
-def get_qr_code(bierdeckel_id: str, db: Session = Depends(get_db)):
-    bd = db.query(Bierdeckel).filter(Bierdeckel.id == bierdeckel_id).first()
+def get_qr_code(bierdeckel_id: str, request: Request, db: Session = Depends(get_db)):
+    bd = coaster_store.get_many(db, [bierdeckel_id]).get(bierdeckel_id)
     if not bd:
         raise HTTPException(status_code=404, detail="Bierdeckel nicht gefunden")
 
-    table = db.query(Table).filter(Table.id == bd.table_id).first()
+    etag = etag_for(bd.id, bd.label, bd.table_number, bd.qr_code)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
 
-    qr = qrcode.make(bd.qr_code)
-    buffer = io.BytesIO()
-    qr.save(buffer, format="PNG")
-    qr_base64 = base64.b64encode(buffer.getvalue()).decode()
+    qr_base64 = base64.b64encode(qr_cache.png(bd.qr_code)).decode()
 
-    return {
+    return JSONResponse({
         "bierdeckel_id": bd.id,
         "label": bd.label,
-        "table_number": table.table_number if table else None,
+        "table_number": bd.table_number,
         "qr_code_url": bd.qr_code,
         "qr_code_image": f"data:image/png;base64,{qr_base64}"
-    }
+    }, headers={"ETag": etag})
+
+# QR-Code als PNG-Datei
+@router.get("/bierdeckel/{bierdeckel_id}/qr.png")
+def get_qr_png(bierdeckel_id: str, request: Request, db: Session = Depends(get_db)):
+    bd = coaster_store.get_many(db, [bierdeckel_id]).get(bierdeckel_id)
+    if not bd:
+        raise HTTPException(status_code=404, detail="Bierdeckel nicht gefunden")
+
+    etag = etag_for(bd.qr_code)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    return Response(qr_cache.png(bd.qr_code), media_type="image/png", headers={"ETag": etag})
+
+# Alle QR-Codes eines Restaurants (oder Tisches) als ZIP zum Drucken
+@router.get("/restaurant/{restaurant_id}/qr-codes.zip")
+def export_qr_codes(restaurant_id: str, table_id: Optional[str] = None, db: Session = Depends(get_db)):
+    if table_id:
+        coasters = [bd for bd in coaster_store.for_table(db, table_id) if bd.restaurant_id == restaurant_id]
+    else:
+        coasters = coaster_store.for_restaurant(db, restaurant_id)
+    if not coasters:
+        raise HTTPException(status_code=404, detail="Keine Bierdeckel gefunden")
+
+    return Response(
+        build_qr_zip(coasters),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="qr-codes-{restaurant_id}.zip"'}
+    )
 
 # Gewicht aktualisieren (MQTT Bridge)
 @router.post("/bierdeckel/update")
 def update_weight(data: WeightUpdate, db: Session = Depends(get_db)):
-    bd = db.query(Bierdeckel).filter(Bierdeckel.id == data.bierdeckel_id).first()
-    if not bd:
+    results, not_found = apply_weight_updates(db, [(data.bierdeckel_id, data.weight, data.timestamp)])
+    if not_found:
         raise HTTPException(status_code=404, detail="Bierdeckel nicht gefunden")
 
-    bd.weight = data.weight
-    bd.status = weight_to_status(data.weight)
-    bd.last_updated = datetime.utcnow()
-    db.commit()
+    return results[0]
 
-    # Auto-Bestellung prüfen
-    auto_ordered = False
-    if bd.status == "empty":
-        from models.session import TableSession
-        from models.order import Order, OrderItem
-        from models.menu import MenuItem
-
-        active_session = db.query(TableSession).filter(
-            TableSession.bierdeckel_id == bd.id,
-            TableSession.is_active == True,
-            TableSession.auto_order == True
-        ).first()
-
-        if active_session and active_session.auto_order_item_id:
-            menu_item = db.query(MenuItem).filter(
-                MenuItem.id == active_session.auto_order_item_id
-            ).first()
-
-            if menu_item:
-                # Prüfen ob nicht schon eine offene Auto-Bestellung existiert
-                existing = db.query(Order).filter(
-                    Order.session_id == active_session.id,
-                    Order.source == "auto_order",
-                    Order.status.in_(["pending", "preparing"])
-                ).first()
-
-                if not existing:
-                    new_order = Order(
-                        session_id=active_session.id,
-                        total=menu_item.price,
-                        status="pending",
-                        source="auto_order"
-                    )
-                    db.add(new_order)
-                    db.flush()
-
-                    new_item = OrderItem(
-                        order_id=new_order.id,
-                        menu_item_id=menu_item.id,
-                        quantity=1,
-                        price=menu_item.price
-                    )
-                    db.add(new_item)
-                    db.commit()
-                    auto_ordered = True
-                    print(f"Auto-Bestellung: {menu_item.name} für Session {active_session.id}")
+# Viele Gewichte auf einmal aktualisieren (Sensor-Flotte)
+@router.post("/bierdeckel/update-batch")
+def update_weight_batch(data: WeightBatch, db: Session = Depends(get_db)):
+    if len(data.readings) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Maximal {MAX_BATCH_SIZE} Messungen pro Aufruf")
+
+    results, not_found = apply_weight_updates(
+        db, [(r.bierdeckel_id, r.weight, r.timestamp) for r in data.readings]
+    )
 
     return {
-        "bierdeckel_id": bd.id,
-        "weight": bd.weight,
-        "status": bd.status,
-        "last_updated": str(bd.last_updated),
-        "auto_ordered": auto_ordered
+        "received": len(data.readings),
+        "updated": len(results),
+        "auto_orders": sum(1 for r in results if r["auto_ordered"]),
+        "results": results,
+        "not_found": not_found
+    }
+
+# Gewichtsverlauf (min/max/avg pro Zeitfenster)
+@router.get("/bierdeckel/{bierdeckel_id}/weight-history")
+def get_weight_history(bierdeckel_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                       bucket: float = 60, db: Session = Depends(get_db)):
+    if not coaster_store.get_many(db, [bierdeckel_id]):
+        raise HTTPException(status_code=404, detail="Bierdeckel nicht gefunden")
+
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - 3600
+    if end <= start:
+        raise HTTPException(status_code=400, detail="Ungültiger Zeitraum")
+    if bucket < MIN_BUCKET:
+        raise HTTPException(status_code=400, detail=f"Zeitfenster mindestens {MIN_BUCKET} Sekunde")
+    if (end - start) / bucket > MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Maximal {MAX_BUCKETS} Zeitfenster pro Abfrage")
+
+    return {
+        "bierdeckel_id": bierdeckel_id,
+        "start": start,
+        "end": end,
+        "bucket": bucket,
+        "points": weight_history.buckets(bierdeckel_id, start, end, bucket)
     }
 
 # Alle Bierdeckel eines Restaurants (Dashboard)
 @router.get("/restaurant/{restaurant_id}/bierdeckel")
 def get_all_bierdeckel(restaurant_id: str, db: Session = Depends(get_db)):
-    bierdeckel = db.query(Bierdeckel).filter(
-        Bierdeckel.restaurant_id == restaurant_id
-    ).all()
-
-    result = []
-    for bd in bierdeckel:
-        table = db.query(Table).filter(Table.id == bd.table_id).first()
-        result.append({
-            "bierdeckel_id": bd.id,
-            "label": bd.label,
-            "table_number": table.table_number if table else None,
-            "weight": bd.weight,
-            "status": bd.status,
-            "last_updated": str(bd.last_updated)
-        })
-    return result
\ No newline at end of file
+    return [coaster_entry(bd) for bd in coaster_store.for_restaurant(db, restaurant_id)]
+
+
+# Sensor-Zustand aller Bierdeckel (ausgefallene zuerst)
+@router.get("/restaurant/{restaurant_id}/bierdeckel/health")
+def get_bierdeckel_health(restaurant_id: str, db: Session = Depends(get_db)):
+    summary = sensor_health.summary(coaster_store.for_restaurant(db, restaurant_id))
+    summary["restaurant_id"] = restaurant_id
+    return summary
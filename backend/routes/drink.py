@@ -4,6 +4,7 @@ from database.db import get_db
 from models.session import TableSession
 from models.table import Table
 from models.drink import DrinkGroup, Invitation
+from services.session_events import notify_sessions, notify_session_info, notify_group
 import random
 import string
 
@@ -77,6 +78,7 @@ def create_group(session_id: str, db: Session = Depends(get_db)):
 
     session.group_id = new_group.id
     db.commit()
+    notify_session_info(db, [session_id])
 
     return {
         "group_id": new_group.id,
@@ -106,6 +108,8 @@ def join_group(session_id: str, invite_code: str, db: Session = Depends(get_db))
 
     session.group_id = group.id
     db.commit()
+    notify_session_info(db, [session_id])
+    notify_group(db, group.id)
 
     return {
         "message": "Gruppe beigetreten!",
@@ -143,6 +147,7 @@ def send_invitation(session_id: str, target_session_id: str, db: Session = Depen
         db.refresh(new_group)
         session.group_id = new_group.id
         db.commit()
+        notify_session_info(db, [session_id])
 
     invitation = Invitation(
         from_session_id=session_id,
@@ -154,6 +159,12 @@ def send_invitation(session_id: str, target_session_id: str, db: Session = Depen
     db.refresh(invitation)
 
     from_table = db.query(Table).filter(Table.id == session.table_id).first()
+    notify_sessions([target_session_id], "invitation", {
+        "invitation_id": invitation.id,
+        "from_table": from_table.table_number if from_table else None,
+        "group_id": invitation.group_id,
+        "created_at": str(invitation.created_at)
+    })
 
     return {
         "message": "Einladung gesendet!",
@@ -204,6 +215,12 @@ def accept_invitation(invitation_id: str, db: Session = Depends(get_db)):
         from_session.drink_ready = False
 
     db.commit()
+    notify_sessions([invitation.from_session_id], "invitation_answered", {
+        "invitation_id": invitation.id,
+        "status": invitation.status
+    })
+    notify_session_info(db, [invitation.to_session_id])
+    notify_group(db, invitation.group_id)
 
     return {
         "message": "Einladung akzeptiert! Du bist jetzt in der Gruppe.",
@@ -221,6 +238,10 @@ def decline_invitation(invitation_id: str, db: Session = Depends(get_db)):
 
     invitation.status = "declined"
     db.commit()
+    notify_sessions([invitation.from_session_id], "invitation_answered", {
+        "invitation_id": invitation.id,
+        "status": invitation.status
+    })
 
     return {"message": "Einladung abgelehnt"}
 
@@ -277,4 +298,6 @@ def leave_group(session_id: str, db: Session = Depends(get_db)):
             group.status = "closed"
             db.commit()
 
+    notify_session_info(db, [session_id])
+    notify_group(db, group_id)
     return {"message": "Gruppe verlassen"}
\ No newline at end of file
@@ -8,6 +8,9 @@ from models.session import TableSession
 from models.order import Order, OrderItem
 from models.menu import MenuItem
 from models.table import Table
+from services.order_queue import order_queue, load_orders
+from services.balance import book
+from services.session_events import notify_game
 
 router = APIRouter()
 
@@ -118,6 +121,7 @@ def request_join(game_id: str, session_id: str, db: Session = Depends(get_db)):
     )
     db.add(player)
     db.commit()
+    notify_game(db, game, "requested")
 
     return {"message": "Beitritt angefragt!", "game_id": game_id}
 
@@ -151,6 +155,9 @@ def approve_player(game_id: str, player_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Spieler nicht gefunden")
     player.status = "approved"
     db.commit()
+    game = db.query(Game).filter(Game.id == game_id).first()
+    if game:
+        notify_game(db, game, "approved")
     return {"message": "Spieler genehmigt!"}
 
 # Spieler ablehnen
@@ -164,6 +171,9 @@ def decline_player(game_id: str, player_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Spieler nicht gefunden")
     player.status = "declined"
     db.commit()
+    game = db.query(Game).filter(Game.id == game_id).first()
+    if game:
+        notify_game(db, game, "declined")
     return {"message": "Spieler abgelehnt"}
 
 # Spiel starten
@@ -183,6 +193,7 @@ def start_game(game_id: str, db: Session = Depends(get_db)):
 
     game.status = "active"
     db.commit()
+    notify_game(db, game, "started")
     return {"message": "Spiel gestartet!", "game_id": game_id}
 
 # Fertig getrunken
@@ -221,6 +232,7 @@ def player_finished(game_id: str, data: PlayerFinish, db: Session = Depends(get_
 
         winners = [p for p in all_players if p.finished]
         extra_cost = 0
+        settlement_ids = []
 
         for winner in winners:
             winner_orders = db.query(Order).filter(
@@ -264,9 +276,12 @@ def player_finished(game_id: str, data: PlayerFinish, db: Session = Depends(get_
                     price=drink_price
                 )
                 db.add(loser_item)
+                book(db, loser.session_id, total=drink_price)
                 extra_cost += drink_price
+                settlement_ids.append(loser_order.id)
 
                 # Gewinner-Getränk als "vom Spiel bezahlt" markieren
+                previous_total = found_order.total
                 if found_item.quantity > 1:
                     found_item.quantity -= 1
                     found_order.total = found_order.total - drink_price
@@ -283,12 +298,18 @@ def player_finished(game_id: str, data: PlayerFinish, db: Session = Depends(get_
                 )
                 db.add(winner_credit)
                 db.flush()
+                settlement_ids.append(winner_credit.id)
 
                 if found_order.total <= 0:
                     found_order.total = 0
+                book(db, winner.session_id, total=found_order.total - previous_total)
 
         db.commit()
 
+        # Spielabrechnung an die Theke (Bestellungen sind schon "delivered")
+        if settlement_ids:
+            order_queue.push(load_orders(db, Order.id.in_(settlement_ids)))
+
         # Spielstatistik aktualisieren
         try:
             from models.customer_stats import CustomerStats
@@ -320,6 +341,7 @@ def player_finished(game_id: str, data: PlayerFinish, db: Session = Depends(get_
         except Exception as e:
             print(f"Stats error: {e}")
 
+        notify_game(db, game, "finished")
         return {
             "message": "Spiel beendet! Verlierer zahlt die Getränke!",
             "loser_session_id": loser.session_id,
@@ -327,6 +349,7 @@ def player_finished(game_id: str, data: PlayerFinish, db: Session = Depends(get_
             "game_status": "finished"
         }
 
+    notify_game(db, game, "player_finished")
     return {
         "message": "Fertig! Warte auf andere...",
         "remaining_players": len(not_finished),
@@ -4,6 +4,7 @@ from pydantic import BaseModel
 from typing import Optional
 from database.db import get_db
 from models.menu import MenuItem
+from services.auto_order_index import auto_order_index
 
 router = APIRouter()
 
@@ -89,6 +90,7 @@ def update_menu_item(item_id: str, data: MenuItemUpdate, db: Session = Depends(g
         item.is_available = data.is_available
 
     db.commit()
+    auto_order_index.update_item(item)
     return {"message": "Menü-Item aktualisiert"}
 
 # Menü-Item löschen
@@ -100,4 +102,5 @@ def delete_menu_item(item_id: str, db: Session = Depends(get_db)):
 
     db.delete(item)
     db.commit()
+    auto_order_index.remove_item(item_id)
     return {"message": "Menü-Item gelöscht"}
\ No newline at end of file
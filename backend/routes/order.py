@@ -1,11 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy.orm import Session
+from sqlalchemy import update, select
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+from datetime import datetime
+import uuid
 from database.db import get_db
 from models.order import Order, OrderItem
 from models.menu import MenuItem
 from models.session import TableSession
+from services.auto_order_index import auto_order_index, AUTO_ORDER_SOURCES
+from services.refill_predictor import refill_predictor
+from services.coaster_state import coaster_store
+from services.order_queue import order_queue, order_entry, open_orders, bar_topic
+from services.events import sse_response
+from services.idempotency import idempotency, request_hash
+from services.balance import book
 
 router = APIRouter()
 
@@ -16,9 +26,28 @@ class OrderItemCreate(BaseModel):
 class OrderCreate(BaseModel):
     items: List[OrderItemCreate]
 
-# Bestellung aufgeben
+class BulkStatusUpdate(BaseModel):
+    status: str
+    order_ids: Optional[List[str]] = None
+    table_id: Optional[str] = None
+    group_id: Optional[str] = None
+
+# Erlaubte Ausgangsstatus je Zielstatus (nur vorwärts)
+STATUS_TRANSITIONS = {
+    "preparing": ("pending",),
+    "delivered": ("pending", "preparing")
+}
+
+# Bestellung aufgeben (Wiederholungen mit gleichem Idempotency-Key liefern die erste Antwort)
 @router.post("/session/{session_id}/order")
-def create_order(session_id: str, data: OrderCreate, db: Session = Depends(get_db)):
+def create_order(session_id: str, data: OrderCreate, db: Session = Depends(get_db),
+                 idempotency_key: Optional[str] = Header(None)):
+    key = idempotency.scoped(idempotency_key, f"order/{session_id}")
+    fingerprint = request_hash(data.model_dump())
+    stored = idempotency.lookup(db, key, fingerprint)
+    if stored is not None:
+        return stored
+
     # Session prüfen
     session = db.query(TableSession).filter(
         TableSession.id == session_id,
@@ -27,33 +56,39 @@ def create_order(session_id: str, data: OrderCreate, db: Session = Depends(get_d
     if not session:
         raise HTTPException(status_code=404, detail="Session nicht gefunden oder nicht aktiv")
 
-    # Neue Bestellung erstellen
-    new_order = Order(session_id=session_id)
-    db.add(new_order)
-    db.commit()
-    db.refresh(new_order)
-
-    total = 0
-    order_items = []
-
+    # Alle Menü-Items mit einer Abfrage laden und vorab prüfen
+    menu_items = {
+        m.id: m for m in db.query(MenuItem).filter(
+            MenuItem.id.in_({item.menu_item_id for item in data.items})
+        ).all()
+    }
     for item in data.items:
-        # Menü-Item prüfen
-        menu_item = db.query(MenuItem).filter(MenuItem.id == item.menu_item_id).first()
+        menu_item = menu_items.get(item.menu_item_id)
         if not menu_item:
             raise HTTPException(status_code=404, detail=f"Menü-Item {item.menu_item_id} nicht gefunden")
         if not menu_item.is_available:
             raise HTTPException(status_code=400, detail=f"{menu_item.name} ist nicht verfügbar")
+        if item.quantity < 1:
+            raise HTTPException(status_code=400, detail="Menge muss mindestens 1 sein")
+
+    # Bestellung, Artikel und Treuepunkte in einer Transaktion schreiben
+    order_id = str(uuid.uuid4())
+    created_at = datetime.utcnow()
+    total = 0
+    order_items = []
+    new_items = []
 
+    for item in data.items:
+        menu_item = menu_items[item.menu_item_id]
         item_total = menu_item.price * item.quantity
         total += item_total
 
-        order_item = OrderItem(
-            order_id=new_order.id,
+        new_items.append(OrderItem(
+            order_id=order_id,
             menu_item_id=item.menu_item_id,
             quantity=item.quantity,
             price=menu_item.price
-        )
-        db.add(order_item)
+        ))
         order_items.append({
             "name": menu_item.name,
             "quantity": item.quantity,
@@ -61,9 +96,9 @@ def create_order(session_id: str, data: OrderCreate, db: Session = Depends(get_d
             "subtotal": item_total
         })
 
-    # Total speichern
-    new_order.total = total
-    db.commit()
+    db.add(Order(id=order_id, session_id=session_id, total=total, status="pending", created_at=created_at))
+    db.add_all(new_items)
+    book(db, session_id, total=total)
 
     # Treuepunkte aktualisieren
     if session.customer_id:
@@ -72,29 +107,44 @@ def create_order(session_id: str, data: OrderCreate, db: Session = Depends(get_d
             LoyaltyProgram.restaurant_id == session.restaurant_id,
             LoyaltyProgram.is_active == True
         ).all()
-        for prog in programs:
-            loyalty = db.query(CustomerLoyalty).filter(
-                CustomerLoyalty.customer_id == session.customer_id,
-                CustomerLoyalty.loyalty_program_id == prog.id
-            ).first()
-            if not loyalty:
-                loyalty = CustomerLoyalty(
-                    customer_id=session.customer_id,
-                    loyalty_program_id=prog.id,
-                    current_count=0
-                )
-                db.add(loyalty)
-            loyalty.current_count += 1
-            db.commit()
+        if programs:
+            progress = {
+                l.loyalty_program_id: l for l in db.query(CustomerLoyalty).filter(
+                    CustomerLoyalty.customer_id == session.customer_id,
+                    CustomerLoyalty.loyalty_program_id.in_([p.id for p in programs])
+                ).all()
+            }
+            for prog in programs:
+                loyalty = progress.get(prog.id)
+                if not loyalty:
+                    loyalty = CustomerLoyalty(
+                        customer_id=session.customer_id,
+                        loyalty_program_id=prog.id,
+                        current_count=0
+                    )
+                    db.add(loyalty)
+                loyalty.current_count += 1
 
-    return {
-        "order_id": new_order.id,
+    response = {
+        "order_id": order_id,
         "session_id": session_id,
         "items": order_items,
         "total": total,
-        "status": new_order.status,
-        "created_at": str(new_order.created_at)
+        "status": "pending",
+        "created_at": str(created_at)
     }
+    stored = idempotency.commit(db, key, fingerprint, response)
+    if stored is not response:
+        return stored
+
+    # An die Theke weitergeben
+    coaster = coaster_store.get_many(db, [session.bierdeckel_id]).get(session.bierdeckel_id)
+    order_queue.push([order_entry(
+        order_id, session.restaurant_id, session_id, coaster.table_number if coaster else None,
+        [{"name": i["name"], "quantity": i["quantity"]} for i in order_items],
+        total, "pending", "manual", created_at
+    )])
+    return response
 
 # Bestellung abrufen
 @router.get("/order/{order_id}")
@@ -159,45 +209,71 @@ def update_order_status(order_id: str, status: str, db: Session = Depends(get_db
 
     order.status = status
     db.commit()
+    if order.source in AUTO_ORDER_SOURCES:
+        auto_order_index.set_open(order.session_id, status != "delivered")
+    if status == "delivered":
+        refill_predictor.forget_order(order_id)
+    order_queue.set_status(db, order_id, status)
     return {"message": f"Status auf '{status}' gesetzt", "order_id": order_id}
 
-# Alle offenen Bestellungen eines Restaurants (für Service-Dashboard)
-@router.get("/restaurant/{restaurant_id}/orders")
-def get_restaurant_orders(restaurant_id: str, db: Session = Depends(get_db)):
-    sessions = db.query(TableSession).filter(
-        TableSession.restaurant_id == restaurant_id,
-        TableSession.is_active == True
-    ).all()
+# Mehrere Bestellungen auf einmal weiterschalten: per order_ids, table_id oder
+# group_id, ein UPDATE in einer Transaktion. Liefert die geänderten IDs.
+@router.put("/restaurant/{restaurant_id}/orders/status")
+def update_orders_status(restaurant_id: str, data: BulkStatusUpdate, db: Session = Depends(get_db)):
+    if data.status not in STATUS_TRANSITIONS:
+        raise HTTPException(status_code=400, detail="Ungültiger Status")
+    selectors = [x for x in (data.order_ids, data.table_id, data.group_id) if x]
+    if len(selectors) != 1:
+        raise HTTPException(status_code=400, detail="Genau eines von order_ids, table_id oder group_id angeben")
+
+    sessions = select(TableSession.id).where(TableSession.restaurant_id == restaurant_id)
+    if data.table_id:
+        sessions = sessions.where(TableSession.table_id == data.table_id, TableSession.is_active == True)
+    elif data.group_id:
+        sessions = sessions.where(TableSession.group_id == data.group_id, TableSession.is_active == True)
+
+    criteria = [
+        Order.session_id.in_(sessions),
+        Order.status.in_(STATUS_TRANSITIONS[data.status])
+    ]
+    if data.order_ids:
+        criteria.append(Order.id.in_(data.order_ids))
 
-    session_ids = [s.id for s in sessions]
-    orders = db.query(Order).filter(
-        Order.session_id.in_(session_ids),
-        Order.status != "delivered"
+    rows = db.execute(
+        update(Order).where(*criteria).values(status=data.status)
+        .returning(Order.id, Order.session_id, Order.source)
+        .execution_options(synchronize_session=False)
     ).all()
+    db.commit()
 
-    result = []
-    for order in orders:
-        session = db.query(TableSession).filter(TableSession.id == order.session_id).first()
-        from models.table import Table
-        table = db.query(Table).filter(Table.id == session.table_id).first()
+    order_ids = [order_id for order_id, _, _ in rows]
+    if data.status == "delivered":
+        for order_id, session_id, source in rows:
+            if source in AUTO_ORDER_SOURCES:
+                auto_order_index.set_open(session_id, False)
+            refill_predictor.forget_order(order_id)
+    order_queue.set_statuses(db, order_ids, data.status)
 
-        items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
-        order_items = []
-        for item in items:
-            menu_item = db.query(MenuItem).filter(MenuItem.id == item.menu_item_id).first()
-            order_items.append({
-                "name": menu_item.name if menu_item else "Unbekannt",
-                "quantity": item.quantity
-            })
+    return {
+        "message": f"{len(order_ids)} Bestellungen auf '{data.status}' gesetzt",
+        "status": data.status,
+        "order_ids": order_ids
+    }
 
-        result.append({
-            "order_id": order.id,
-            "items": order_items,
-            "total": order.total,
-            "status": order.status,
-            "source": order.source or "manual",
-            "created_at": str(order.created_at)
-        })
-    return result
+# Alle offenen Bestellungen eines Restaurants (für Service-Dashboard)
+@router.get("/restaurant/{restaurant_id}/orders")
+def get_restaurant_orders(restaurant_id: str, db: Session = Depends(get_db)):
+    return open_orders(db, restaurant_id)
+
+# Thekenanzeige: offene Bestellungen nach Priorität und Alter
+@router.get("/restaurant/{restaurant_id}/bar/queue")
+def get_bar_queue(restaurant_id: str, db: Session = Depends(get_db)):
+    return order_queue.entries(db, restaurant_id)
+
+# Thekenanzeige per Server-Sent Events: erst "queue" mit allen offenen
+# Bestellungen, danach ein "order"-Ereignis pro neuer oder geänderter Bestellung
+@router.get("/restaurant/{restaurant_id}/bar/stream")
+def stream_bar_queue(restaurant_id: str):
+    return sse_response(bar_topic(restaurant_id), lambda: order_queue.snapshot(restaurant_id))
 
 # Bestellstatus ändern (für Service)
\ No newline at end of file
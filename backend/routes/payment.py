@@ -1,13 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Optional
+import uuid
 from database.db import get_db
 from models.payment import Payment
 from models.order import Order, OrderItem
 from models.session import TableSession
 from models.menu import MenuItem
 from models.table import Table
+from models.split import BillSplit, SplitShare
+from services.idempotency import idempotency, request_hash
+from services.balance import get_balance, get_balances, book, settle, retry_pause, SETTLE_RETRIES
+from services.split import allocate, split_weights
+from services.dashboard import dashboard_feed, payment_requests
+from services.service_queue import service_queue, load_payments
 
 router = APIRouter()
 
@@ -18,50 +25,51 @@ def get_bill(session_id: str, db: Session = Depends(get_db)):
     if not session:
         raise HTTPException(status_code=404, detail="Session nicht gefunden")
 
-    orders = db.query(Order).filter(Order.session_id == session_id).all()
+    # Alle Artikel samt Namen in einer Abfrage
+    rows = db.query(Order.source, OrderItem.quantity, OrderItem.price, MenuItem.name).join(
+        OrderItem, OrderItem.order_id == Order.id
+    ).outerjoin(
+        MenuItem, MenuItem.id == OrderItem.menu_item_id
+    ).filter(Order.session_id == session_id).order_by(Order.created_at).all()
 
     items_list = []
-    total = 0
-    for order in orders:
-        order_items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
-        for oi in order_items:
-            menu_item = db.query(MenuItem).filter(MenuItem.id == oi.menu_item_id).first()
-
-            # Quelle bestimmen
-            if order.source == "game_loser":
-                source_label = "🎮 Spiel (du zahlst)"
-            elif order.source == "game_winner":
-                source_label = "🎮 Spiel (gratis!)"
-            else:
-                source_label = None
-
-            items_list.append({
-                "name": menu_item.name if menu_item else "Unbekannt",
-                "quantity": oi.quantity,
-                "price": oi.price,
-                "subtotal": oi.price * oi.quantity,
-                "source": order.source,
-                "source_label": source_label
-            })
-            total += oi.price * oi.quantity
-
-    payments = db.query(Payment).filter(
-        Payment.session_id == session_id,
-        Payment.status == "completed"
-    ).all()
-    already_paid = sum(p.amount for p in payments)
+    for source, quantity, price, name in rows:
+        # Quelle bestimmen
+        if source == "game_loser":
+            source_label = "🎮 Spiel (du zahlst)"
+        elif source == "game_winner":
+            source_label = "🎮 Spiel (gratis!)"
+        else:
+            source_label = None
+
+        items_list.append({
+            "name": name or "Unbekannt",
+            "quantity": quantity,
+            "price": price,
+            "subtotal": price * quantity,
+            "source": source,
+            "source_label": source_label
+        })
 
+    balance = get_balance(db, session_id)
     return {
         "session_id": session_id,
         "items": items_list,
-        "total": total,
-        "already_paid": already_paid,
-        "remaining": total - already_paid
+        "total": balance.total,
+        "already_paid": balance.paid,
+        "remaining": balance.remaining
     }
 
-# Einzelzahlung
+# Einzelzahlung (Wiederholungen mit gleichem Idempotency-Key liefern die erste Antwort)
 @router.post("/session/{session_id}/pay")
-def pay_single(session_id: str, db: Session = Depends(get_db)):
+def pay_single(session_id: str, db: Session = Depends(get_db),
+               idempotency_key: Optional[str] = Header(None)):
+    key = idempotency.scoped(idempotency_key, f"pay/{session_id}")
+    fingerprint = request_hash(None)
+    stored = idempotency.lookup(db, key, fingerprint)
+    if stored is not None:
+        return stored
+
     session = db.query(TableSession).filter(
         TableSession.id == session_id,
         TableSession.is_active == True
@@ -69,40 +77,48 @@ def pay_single(session_id: str, db: Session = Depends(get_db)):
     if not session:
         raise HTTPException(status_code=404, detail="Session nicht gefunden")
 
-    orders = db.query(Order).filter(Order.session_id == session_id).all()
-    total = sum(o.total for o in orders)
-
-    payments = db.query(Payment).filter(
-        Payment.session_id == session_id,
-        Payment.status == "completed"
-    ).all()
-    already_paid = sum(p.amount for p in payments)
-    remaining = total - already_paid
-
-    if remaining <= 0:
-        raise HTTPException(status_code=400, detail="Bereits alles bezahlt")
-
-    payment = Payment(
+    # Saldo nur verbuchen, wenn ihn seit dem Lesen niemand geändert hat
+    for attempt in range(SETTLE_RETRIES):
+        balance = get_balance(db, session_id)
+        remaining = balance.remaining
+        if remaining <= 0:
+            raise HTTPException(status_code=400, detail="Bereits alles bezahlt")
+        if settle(db, [balance], {session_id: remaining}):
+            break
+        db.rollback()
+        retry_pause(attempt)
+    else:
+        raise HTTPException(status_code=409, detail="Zahlung wird gerade verarbeitet, bitte erneut versuchen")
+
+    payment_id = str(uuid.uuid4())
+    db.add(Payment(
+        id=payment_id,
         session_id=session_id,
         amount=remaining,
         payment_type="single",
         status="completed"
-    )
-    db.add(payment)
-    db.commit()
-    db.refresh(payment)
+    ))
 
-    return {
-        "payment_id": payment.id,
+    response = idempotency.commit(db, key, fingerprint, {
+        "payment_id": payment_id,
         "session_id": session_id,
         "amount": remaining,
         "payment_type": "single",
         "status": "completed"
-    }
+    })
+    dashboard_feed.touch([session_id])
+    return response
 
-# Zahlungswunsch senden (Kellner rufen)
+# Zahlungswunsch senden (Kellner rufen), mit Idempotency-Key wie bei /pay
 @router.post("/session/{session_id}/payment-request")
-def request_payment(session_id: str, db: Session = Depends(get_db)):
+def request_payment(session_id: str, db: Session = Depends(get_db),
+                    idempotency_key: Optional[str] = Header(None)):
+    key = idempotency.scoped(idempotency_key, f"payment-request/{session_id}")
+    fingerprint = request_hash(None)
+    stored = idempotency.lookup(db, key, fingerprint)
+    if stored is not None:
+        return stored
+
     session = db.query(TableSession).filter(
         TableSession.id == session_id,
         TableSession.is_active == True
@@ -110,60 +126,31 @@ def request_payment(session_id: str, db: Session = Depends(get_db)):
     if not session:
         raise HTTPException(status_code=404, detail="Session nicht gefunden")
 
-    orders = db.query(Order).filter(Order.session_id == session_id).all()
-    total = sum(o.total for o in orders)
-
-    payments = db.query(Payment).filter(
-        Payment.session_id == session_id,
-        Payment.status == "completed"
-    ).all()
-    already_paid = sum(p.amount for p in payments)
-    remaining = total - already_paid
+    remaining = get_balance(db, session_id).remaining
 
-    payment = Payment(
+    payment_id = str(uuid.uuid4())
+    db.add(Payment(
+        id=payment_id,
         session_id=session_id,
         amount=remaining,
         payment_type="single",
         status="requested"
-    )
-    db.add(payment)
-    db.commit()
-    db.refresh(payment)
+    ))
 
-    return {
-        "payment_id": payment.id,
+    response = idempotency.commit(db, key, fingerprint, {
+        "payment_id": payment_id,
         "amount": remaining,
         "status": "requested",
         "message": "Zahlungswunsch an Kellner gesendet!"
-    }
+    })
+    dashboard_feed.touch([session_id], "payments")
+    service_queue.push(load_payments(db, Payment.id == payment_id))
+    return response
 
 # Offene Zahlungswünsche (Dashboard)
 @router.get("/restaurant/{restaurant_id}/payment-requests")
 def get_payment_requests(restaurant_id: str, db: Session = Depends(get_db)):
-    sessions = db.query(TableSession).filter(
-        TableSession.restaurant_id == restaurant_id,
-        TableSession.is_active == True
-    ).all()
-    session_ids = [s.id for s in sessions]
-
-    payments = db.query(Payment).filter(
-        Payment.session_id.in_(session_ids),
-        Payment.status == "requested"
-    ).all()
-
-    result = []
-    for p in payments:
-        session = db.query(TableSession).filter(TableSession.id == p.session_id).first()
-        table = db.query(Table).filter(Table.id == session.table_id).first()
-        result.append({
-            "payment_id": p.id,
-            "session_id": p.session_id,
-            "table_number": table.table_number if table else None,
-            "amount": p.amount,
-            "status": p.status,
-            "created_at": str(p.created_at)
-        })
-    return result
+    return payment_requests(db, restaurant_id)
 
 # Kellner: Zahlung bestätigen
 @router.put("/payment/{payment_id}/confirm")
@@ -172,8 +159,16 @@ def confirm_payment(payment_id: str, db: Session = Depends(get_db)):
     if not payment:
         raise HTTPException(status_code=404, detail="Zahlung nicht gefunden")
 
-    payment.status = "completed"
+    # Nur der erste Aufruf verbucht den Betrag
+    confirmed = db.query(Payment).filter(
+        Payment.id == payment_id,
+        Payment.status != "completed"
+    ).update({Payment.status: "completed"}, synchronize_session=False)
+    if confirmed:
+        book(db, payment.session_id, paid=payment.amount)
     db.commit()
+    dashboard_feed.touch([payment.session_id], "payments")
+    service_queue.push(load_payments(db, Payment.id == payment_id))
 
     return {
         "message": "Zahlung bestätigt!",
@@ -182,6 +177,27 @@ def confirm_payment(payment_id: str, db: Session = Depends(get_db)):
         "status": "completed"
     }
 
+# Aktive Sessions einer Gruppe mit Tischnummer und Saldo (zwei Abfragen)
+def load_group(db: Session, group_id):
+    sessions = db.query(TableSession.id, TableSession.table_id, Table.table_number).outerjoin(
+        Table, Table.id == TableSession.table_id
+    ).filter(
+        TableSession.group_id == group_id,
+        TableSession.is_active == True
+    ).order_by(Table.table_number).all()
+    balances = get_balances(db, [session_id for session_id, _, _ in sessions])
+    return sessions, balances
+
+# Alle Artikel der Gruppe samt Namen in einer Abfrage
+def group_items(db: Session, session_ids):
+    if not session_ids:
+        return []
+    return db.query(OrderItem.id, Order.session_id, OrderItem.quantity, OrderItem.price, MenuItem.name).join(
+        Order, Order.id == OrderItem.order_id
+    ).outerjoin(
+        MenuItem, MenuItem.id == OrderItem.menu_item_id
+    ).filter(Order.session_id.in_(session_ids)).order_by(Order.created_at).all()
+
 # Für alle in der Gruppe bezahlen
 @router.post("/session/{session_id}/pay-group")
 def pay_for_group(session_id: str, db: Session = Depends(get_db)):
@@ -194,51 +210,45 @@ def pay_for_group(session_id: str, db: Session = Depends(get_db)):
     if not session.group_id:
         raise HTTPException(status_code=400, detail="Du bist in keiner Gruppe")
 
-    group_sessions = db.query(TableSession).filter(
-        TableSession.group_id == session.group_id,
-        TableSession.is_active == True
-    ).all()
-
-    total_paid = 0
-    paid_sessions = []
-
-    for gs in group_sessions:
-        orders = db.query(Order).filter(Order.session_id == gs.id).all()
-        total = sum(o.total for o in orders)
-
-        payments = db.query(Payment).filter(
-            Payment.session_id == gs.id,
-            Payment.status == "completed"
-        ).all()
-        already_paid = sum(p.amount for p in payments)
-        remaining = total - already_paid
-
-        if remaining > 0:
-            payment = Payment(
-                session_id=gs.id,
-                amount=remaining,
-                payment_type="group",
-                status="completed"
-            )
-            db.add(payment)
-            total_paid += remaining
-
-        table = db.query(Table).filter(Table.id == gs.table_id).first()
-        paid_sessions.append({
-            "session_id": gs.id,
-            "table_number": table.table_number if table else None,
-            "amount": remaining
-        })
-
+    # Alle offenen Salden der Gruppe auf einmal verbuchen, nur wenn sich keiner
+    # seit dem Lesen geändert hat (sonst neu lesen)
+    for attempt in range(SETTLE_RETRIES):
+        group_sessions, balances = load_group(db, session.group_id)
+        paid = {
+            gs_id: balances[gs_id].remaining
+            for gs_id, _, _ in group_sessions if balances[gs_id].remaining > 0
+        }
+        if settle(db, [balances[gs_id] for gs_id in paid], paid):
+            break
+        db.rollback()
+        retry_pause(attempt)
+    else:
+        raise HTTPException(status_code=409, detail="Zahlung wird gerade verarbeitet, bitte erneut versuchen")
+
+    paid_sessions = [
+        {
+            "session_id": gs_id,
+            "table_number": table_number,
+            "amount": balances[gs_id].remaining
+        }
+        for gs_id, _, table_number in group_sessions
+    ]
+
+    db.add_all([
+        Payment(session_id=gs_id, amount=amount, payment_type="group", status="completed")
+        for gs_id, amount in paid.items()
+    ])
     db.commit()
+    dashboard_feed.touch(paid)
 
+    total_paid = sum(paid.values())
     return {
         "message": f"Für alle bezahlt! Gesamt: {total_paid:.2f} €",
         "total_paid": total_paid,
         "paid_sessions": paid_sessions
     }
 
-# Gruppen-Rechnung anzeigen
+# Gruppen-Rechnung anzeigen, nach Tischen gruppiert
 @router.get("/session/{session_id}/group-bill")
 def get_group_bill(session_id: str, db: Session = Depends(get_db)):
     session = db.query(TableSession).filter(TableSession.id == session_id).first()
@@ -247,42 +257,126 @@ def get_group_bill(session_id: str, db: Session = Depends(get_db)):
     if not session.group_id:
         raise HTTPException(status_code=400, detail="Du bist in keiner Gruppe")
 
-    group_sessions = db.query(TableSession).filter(
-        TableSession.group_id == session.group_id,
-        TableSession.is_active == True
-    ).all()
-
-    group_total = 0
-    group_items = []
-
-    for gs in group_sessions:
-        table = db.query(Table).filter(Table.id == gs.table_id).first()
-        orders = db.query(Order).filter(Order.session_id == gs.id).all()
-
-        for order in orders:
-            order_items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
-            for oi in order_items:
-                menu_item = db.query(MenuItem).filter(MenuItem.id == oi.menu_item_id).first()
-                group_items.append({
-                    "table_number": table.table_number if table else None,
-                    "name": menu_item.name if menu_item else "Unbekannt",
-                    "quantity": oi.quantity,
-                    "price": oi.price,
-                    "subtotal": oi.price * oi.quantity
-                })
-                group_total += oi.price * oi.quantity
-
-    group_paid = 0
-    for gs in group_sessions:
-        payments = db.query(Payment).filter(
-            Payment.session_id == gs.id,
-            Payment.status == "completed"
-        ).all()
-        group_paid += sum(p.amount for p in payments)
+    group_sessions, balances = load_group(db, session.group_id)
+
+    tables = {}
+    table_of_session = {}
+    for gs_id, table_id, table_number in group_sessions:
+        balance = balances[gs_id]
+        table = tables.get(table_id)
+        if table is None:
+            table = tables[table_id] = {
+                "table_id": table_id,
+                "table_number": table_number,
+                "total": 0,
+                "paid": 0,
+                "remaining": 0,
+                "items": []
+            }
+        table["total"] += balance.total
+        table["paid"] += balance.paid
+        table["remaining"] += balance.remaining
+        table_of_session[gs_id] = table
+
+    for item_id, gs_id, quantity, price, name in group_items(db, list(table_of_session)):
+        table = table_of_session[gs_id]
+        table["items"].append({
+            "order_item_id": item_id,
+            "session_id": gs_id,
+            "table_number": table["table_number"],
+            "name": name or "Unbekannt",
+            "quantity": quantity,
+            "price": price,
+            "subtotal": price * quantity
+        })
 
+    group_total = sum(t["total"] for t in tables.values())
+    group_paid = sum(t["paid"] for t in tables.values())
     return {
         "group_total": group_total,
         "group_paid": group_paid,
         "group_remaining": group_total - group_paid,
-        "items": group_items
-    }
\ No newline at end of file
+        "tables": list(tables.values()),
+        "items": [item for table in tables.values() for item in table["items"]]
+    }
+
+class SplitRequest(BaseModel):
+    mode: str  # even, per_item, custom
+    shares: Optional[Dict[str, float]] = None  # custom: Session-ID -> Anteil
+    assignments: Optional[Dict[str, List[str]]] = None  # per_item: Artikel-ID -> Sessions, die ihn teilen
+    preview: bool = False
+
+# Gruppenrechnung aufteilen: der offene Betrag der Gruppe wird nach Anteilen auf
+# die Mitglieder verteilt, alle offenen Salden werden in einem Commit beglichen
+@router.post("/session/{session_id}/split-group")
+def split_group_bill(session_id: str, data: SplitRequest, db: Session = Depends(get_db)):
+    session = db.query(TableSession).filter(
+        TableSession.id == session_id,
+        TableSession.is_active == True
+    ).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Session nicht gefunden")
+    if not session.group_id:
+        raise HTTPException(status_code=400, detail="Du bist in keiner Gruppe")
+
+    for attempt in range(SETTLE_RETRIES):
+        group_sessions, balances = load_group(db, session.group_id)
+        members = [gs_id for gs_id, _, _ in group_sessions]
+        paid = {
+            gs_id: balances[gs_id].remaining
+            for gs_id in members if balances[gs_id].remaining > 0
+        }
+        total_cents = round(sum(paid.values()) * 100)
+        if total_cents <= 0:
+            raise HTTPException(status_code=400, detail="Bereits alles bezahlt")
+
+        items = ()
+        if data.mode == "per_item":
+            items = [
+                (item_id, gs_id, quantity * price)
+                for item_id, gs_id, quantity, price, _ in group_items(db, members)
+            ]
+        weights = split_weights(data.mode, members, items, data.shares, data.assignments)
+        shares = allocate(total_cents, weights)
+
+        if data.preview or settle(db, [balances[gs_id] for gs_id in paid], paid):
+            break
+        db.rollback()
+        retry_pause(attempt)
+    else:
+        raise HTTPException(status_code=409, detail="Zahlung wird gerade verarbeitet, bitte erneut versuchen")
+
+    table_numbers = {gs_id: table_number for gs_id, _, table_number in group_sessions}
+    result = {
+        "split_id": None,
+        "mode": data.mode,
+        "total": total_cents / 100,
+        "shares": [
+            {"session_id": gs_id, "table_number": table_numbers[gs_id], "amount": cents / 100}
+            for gs_id, cents in shares.items()
+        ],
+        "payments": [
+            {"session_id": gs_id, "table_number": table_numbers[gs_id], "amount": amount}
+            for gs_id, amount in paid.items()
+        ]
+    }
+    if data.preview:
+        return result
+
+    # Payment hat keinen Zahler, wer welchen Anteil übernimmt steht in split_shares
+    split_id = str(uuid.uuid4())
+    db.add(BillSplit(id=split_id, group_id=session.group_id, session_id=session_id,
+                     mode=data.mode, total=result["total"]))
+    db.add_all([
+        SplitShare(split_id=split_id, session_id=share["session_id"], amount=share["amount"])
+        for share in result["shares"] if share["amount"] > 0
+    ])
+    db.add_all([
+        Payment(session_id=gs_id, amount=amount, payment_type="split", status="completed")
+        for gs_id, amount in paid.items()
+    ])
+    db.commit()
+    dashboard_feed.touch(paid)
+
+    result["split_id"] = split_id
+    return result
@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response, JSONResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from database.db import get_db
 from models.session import TableSession
-from models.table import Table
-from models.order import Order, OrderItem
-from models.menu import MenuItem
-from models.payment import Payment
 from models.restaurant import Restaurant
+from models.service_call import ServiceCall
+from services.dashboard import dashboard_tables, dashboard_versions, restaurant_topic
+from services.service_queue import service_queue, load_calls
+from services.snapshot import restaurant_snapshot, snapshot_events
+from services.qr import etag_matches
+from services.events import sse_response
 
 router = APIRouter()
 
@@ -15,25 +18,6 @@ class ServiceRequest(BaseModel):
     request_type: str  # "waiter", "napkins", "other"
     message: str = None
 
-# --- Serviceanfrage Model ---
-from sqlalchemy import Column, String, DateTime, ForeignKey
-from database.db import Base, engine
-from datetime import datetime
-import uuid
-
-class ServiceCall(Base):
-    __tablename__ = "service_calls"
-
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    session_id = Column(String, ForeignKey("sessions.id"), nullable=False)
-    restaurant_id = Column(String, ForeignKey("restaurants.id"), nullable=False)
-    request_type = Column(String, nullable=False)
-    message = Column(String)
-    status = Column(String, default="open")  # open, in_progress, done
-    created_at = Column(DateTime, default=datetime.utcnow)
-
-ServiceCall.__table__.create(bind=engine, checkfirst=True)
-
 # --- Gast: Serviceanfrage senden ---
 @router.post("/session/{session_id}/service-request")
 def send_service_request(session_id: str, data: ServiceRequest, db: Session = Depends(get_db)):
@@ -53,6 +37,7 @@ def send_service_request(session_id: str, data: ServiceRequest, db: Session = De
     db.add(new_request)
     db.commit()
     db.refresh(new_request)
+    service_queue.push(load_calls(db, ServiceCall.id == new_request.id))
 
     return {
         "message": "Serviceanfrage gesendet!",
@@ -60,27 +45,10 @@ def send_service_request(session_id: str, data: ServiceRequest, db: Session = De
         "request_type": new_request.request_type
     }
 
-# --- Service: Alle offenen Anfragen sehen ---
+# --- Service: Alle offenen Anfragen sehen (dringendste zuerst) ---
 @router.get("/restaurant/{restaurant_id}/service-requests")
 def get_service_requests(restaurant_id: str, db: Session = Depends(get_db)):
-    requests = db.query(ServiceCall).filter(
-        ServiceCall.restaurant_id == restaurant_id,
-        ServiceCall.status != "done"
-    ).all()
-
-    result = []
-    for r in requests:
-        session = db.query(TableSession).filter(TableSession.id == r.session_id).first()
-        table = db.query(Table).filter(Table.id == session.table_id).first()
-        result.append({
-            "request_id": r.id,
-            "table_number": table.table_number if table else None,
-            "request_type": r.request_type,
-            "message": r.message,
-            "status": r.status,
-            "created_at": str(r.created_at)
-        })
-    return result
+    return service_queue.entries(db, restaurant_id)
 
 # --- Service: Anfrage-Status ändern ---
 @router.put("/service-request/{request_id}/status/{status}")
@@ -94,6 +62,7 @@ def update_service_status(request_id: str, status: str, db: Session = Depends(ge
 
     request.status = status
     db.commit()
+    service_queue.push(load_calls(db, ServiceCall.id == request_id))
     return {"message": f"Status auf '{status}' gesetzt"}
 
 # --- Service: Dashboard Übersicht ---
@@ -103,61 +72,30 @@ def get_dashboard(restaurant_id: str, db: Session = Depends(get_db)):
     if not restaurant:
         raise HTTPException(status_code=404, detail="Restaurant nicht gefunden")
 
-    # Alle Tische
-    tables = db.query(Table).filter(Table.restaurant_id == restaurant_id).all()
-
-    dashboard = []
-    for table in tables:
-        # Aktive Sessions am Tisch
-        sessions = db.query(TableSession).filter(
-            TableSession.table_id == table.id,
-            TableSession.is_active == True
-        ).all()
-
-        table_data = {
-            "table_number": table.table_number,
-            "table_id": table.id,
-            "active_guests": len(sessions),
-            "sessions": []
-        }
-
-        for session in sessions:
-            # Offene Bestellungen
-            orders = db.query(Order).filter(
-                Order.session_id == session.id,
-                Order.status != "delivered"
-            ).all()
-
-            # Gesamtrechnung
-            all_orders = db.query(Order).filter(Order.session_id == session.id).all()
-            total = sum(o.total for o in all_orders)
-
-            # Bezahlt
-            payments = db.query(Payment).filter(
-                Payment.session_id == session.id,
-                Payment.status == "completed"
-            ).all()
-            paid = sum(p.amount for p in payments)
+    return {
+        "restaurant": restaurant.name,
+        "tables": dashboard_tables(db, restaurant_id)
+    }
 
-            # Offene Serviceanfragen
-            open_requests = db.query(ServiceCall).filter(
-                ServiceCall.session_id == session.id,
-                ServiceCall.status != "done"
-            ).all()
+# --- Service: Dashboard als Stream (Anfangsstand, danach nur Änderungen) ---
+@router.get("/restaurant/{restaurant_id}/events")
+def restaurant_events(restaurant_id: str, db: Session = Depends(get_db)):
+    restaurant = db.query(Restaurant).filter(Restaurant.id == restaurant_id).first()
+    if not restaurant:
+        raise HTTPException(status_code=404, detail="Restaurant nicht gefunden")
 
-            table_data["sessions"].append({
-                "session_id": session.id,
-                "open_orders": len(orders),
-                "total": total,
-                "paid": paid,
-                "remaining": total - paid,
-                "open_service_requests": len(open_requests),
-                "created_at": str(session.created_at)
-            })
+    return sse_response(restaurant_topic(restaurant_id), lambda: snapshot_events(restaurant_id))
 
-        dashboard.append(table_data)
+# --- Service: Dashboard in einer Abfrage für Clients ohne Stream ---
+# Unverändert seit dem letzten Abruf -> 304 ohne Datenbankzugriff
+@router.get("/restaurant/{restaurant_id}/snapshot")
+def get_snapshot(restaurant_id: str, request: Request, db: Session = Depends(get_db)):
+    # Version vor den Daten lesen: die Daten sind dann mindestens so neu wie das ETag
+    etag = dashboard_versions.etag(restaurant_id)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
 
-    return {
-        "restaurant": restaurant.name,
-        "tables": dashboard
-    }
\ No newline at end of file
+    snapshot = restaurant_snapshot(db, restaurant_id)
+    if snapshot["restaurant"] is None:
+        raise HTTPException(status_code=404, detail="Restaurant nicht gefunden")
+    return JSONResponse(snapshot, headers={"ETag": etag})
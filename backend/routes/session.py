@@ -4,6 +4,13 @@ from database.db import get_db
 from models.session import TableSession
 from models.bierdeckel import Bierdeckel
 from models.table import Table
+from services.auto_order_index import auto_order_index
+from services.refill_predictor import refill_predictor
+from services.balance import open_balance
+from services.dashboard import dashboard_feed
+from services.events import sse_response
+from services.session_events import session_info, session_snapshot, session_topic, notify_session_info
+import uuid
 
 router = APIRouter()
 
@@ -35,13 +42,16 @@ def scan_bierdeckel(restaurant_id: str, bierdeckel_id: str, db: Session = Depend
         }
 
     new_session = TableSession(
+        id=str(uuid.uuid4()),
         bierdeckel_id=bierdeckel_id,
         table_id=bd.table_id,
         restaurant_id=restaurant_id
     )
     db.add(new_session)
+    open_balance(db, new_session.id)
     db.commit()
     db.refresh(new_session)
+    dashboard_feed.touch([new_session.id])
 
     return {
         "session_id": new_session.id,
@@ -55,21 +65,20 @@ def scan_bierdeckel(restaurant_id: str, bierdeckel_id: str, db: Session = Depend
 # Session abrufen
 @router.get("/session/{session_id}")
 def get_session(session_id: str, db: Session = Depends(get_db)):
-    session = db.query(TableSession).filter(TableSession.id == session_id).first()
+    info = session_info(db, session_id)
+    if not info:
+        raise HTTPException(status_code=404, detail="Session nicht gefunden")
+    return info
+
+# Gast: Änderungen der Session als Stream (Bestellungen, Einladungen, Gruppe,
+# Spiele, Schließen) statt Abfragen im Takt
+@router.get("/session/{session_id}/events")
+def session_events(session_id: str, db: Session = Depends(get_db)):
+    session = db.query(TableSession.id).filter(TableSession.id == session_id).first()
     if not session:
         raise HTTPException(status_code=404, detail="Session nicht gefunden")
-    
-    table = db.query(Table).filter(Table.id == session.table_id).first()
-    
-    return {
-        "session_id": session.id,
-        "bierdeckel_id": session.bierdeckel_id,
-        "table_number": table.table_number if table else None,
-        "restaurant_id": session.restaurant_id,
-        "is_active": session.is_active,
-        "group_id": session.group_id,
-        "created_at": str(session.created_at)
-    }
+
+    return sse_response(session_topic(session_id), lambda: session_snapshot(session_id))
 
 # Session beenden
 @router.put("/session/{session_id}/close")
@@ -80,6 +89,11 @@ def close_session(session_id: str, db: Session = Depends(get_db)):
 
     session.is_active = False
     db.commit()
+    auto_order_index.disable(session_id)
+    refill_predictor.forget_session(session_id)
+    # Offene Zahlungswünsche der Session verschwinden mit ihr
+    dashboard_feed.touch([session_id], "payments")
+    notify_session_info(db, [session_id])
     return {"message": "Session beendet", "session_id": session_id}
 
 # Alle aktiven Sessions eines Restaurants
@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from pydantic import BaseModel
+from typing import List, Optional
 from database.db import get_db
 from models.table import Table
 from models.restaurant import Restaurant
+from models.bierdeckel import Bierdeckel
+from services.coaster_state import coaster_store
+from services.dashboard import dashboard_feed
+import csv
+import io
+import uuid
 
 router = APIRouter()
 
@@ -11,6 +19,17 @@ class TableCreate(BaseModel):
     table_number: int
     seats: int = 4
 
+class LayoutTable(BaseModel):
+    table_number: int
+    seats: int = 4
+    bierdeckel: List[str] = []  # Labels der Bierdeckel
+    bierdeckel_count: Optional[int] = None  # alternativ: Anzahl, Labels werden erzeugt
+
+class LayoutImport(BaseModel):
+    tables: List[LayoutTable]
+
+MAX_LAYOUT_BIERDECKEL = 5000
+
 @router.post("/restaurant/{restaurant_id}/table")
 def create_table(restaurant_id: str, data: TableCreate, db: Session = Depends(get_db)):
     restaurant = db.query(Restaurant).filter(Restaurant.id == restaurant_id).first()
@@ -37,6 +56,7 @@ def create_table(restaurant_id: str, data: TableCreate, db: Session = Depends(ge
     db.add(new_table)
     db.commit()
     db.refresh(new_table)
+    dashboard_feed.touch_restaurant(restaurant_id)
 
     return {
         "id": new_table.id,
@@ -58,4 +78,121 @@ def get_tables(restaurant_id: str, db: Session = Depends(get_db)):
             "seats": t.seats,
             "bierdeckel_count": len(bierdeckel)
         })
-    return result
\ No newline at end of file
+    return result
+
+# Grundriss importieren: alle Tische und Bierdeckel in einer Transaktion
+def import_layout(db: Session, restaurant_id: str, tables: List[LayoutTable]):
+    from routes.bierdeckel import qr_url_for
+
+    restaurant = db.query(Restaurant).filter(Restaurant.id == restaurant_id).first()
+    if not restaurant:
+        raise HTTPException(status_code=404, detail="Restaurant nicht gefunden")
+    if not tables:
+        raise HTTPException(status_code=400, detail="Keine Tische angegeben")
+
+    numbers = [t.table_number for t in tables]
+    if len(set(numbers)) != len(numbers):
+        raise HTTPException(status_code=400, detail="Tischnummern doppelt im Import")
+    for t in tables:
+        if t.table_number < 1:
+            raise HTTPException(status_code=400, detail="Tischnummer muss mindestens 1 sein")
+        if t.seats < 1:
+            raise HTTPException(status_code=400, detail="Plätze müssen mindestens 1 sein")
+        if t.bierdeckel_count is not None and t.bierdeckel_count < 0:
+            raise HTTPException(status_code=400, detail="Anzahl Bierdeckel darf nicht negativ sein")
+
+    total = sum(len(t.bierdeckel) or (t.bierdeckel_count or 0) for t in tables)
+    if total > MAX_LAYOUT_BIERDECKEL:
+        raise HTTPException(status_code=400, detail=f"Maximal {MAX_LAYOUT_BIERDECKEL} Bierdeckel pro Import")
+
+    existing = [n for (n,) in db.query(Table.table_number).filter(
+        Table.restaurant_id == restaurant_id,
+        Table.table_number.in_(numbers)
+    )]
+    if existing:
+        raise HTTPException(status_code=400, detail=f"Tischnummern existieren bereits: {sorted(existing)}")
+
+    # Fortlaufende Labels (BD-001, ...) hinter den vorhandenen Bierdeckeln
+    next_label = db.query(func.count(Bierdeckel.id)).filter(
+        Bierdeckel.restaurant_id == restaurant_id
+    ).scalar() + 1
+
+    table_rows = []
+    bierdeckel_rows = []
+    result = []
+    for t in sorted(tables, key=lambda t: t.table_number):
+        table_id = str(uuid.uuid4())
+        table_rows.append({
+            "id": table_id,
+            "table_number": t.table_number,
+            "seats": t.seats,
+            "restaurant_id": restaurant_id
+        })
+
+        labels = t.bierdeckel
+        if not labels and t.bierdeckel_count:
+            labels = [f"BD-{n:03d}" for n in range(next_label, next_label + t.bierdeckel_count)]
+            next_label += t.bierdeckel_count
+
+        table_bierdeckel = []
+        for label in labels:
+            bierdeckel_id = str(uuid.uuid4())
+            qr_url = qr_url_for(restaurant_id, bierdeckel_id)
+            bierdeckel_rows.append({
+                "id": bierdeckel_id,
+                "label": label,
+                "table_id": table_id,
+                "restaurant_id": restaurant_id,
+                "qr_code": qr_url
+            })
+            table_bierdeckel.append({"id": bierdeckel_id, "label": label, "qr_code_url": qr_url})
+
+        result.append({
+            "id": table_id,
+            "table_number": t.table_number,
+            "seats": t.seats,
+            "bierdeckel": table_bierdeckel
+        })
+
+    db.bulk_insert_mappings(Table, table_rows)
+    db.bulk_insert_mappings(Bierdeckel, bierdeckel_rows)
+    db.commit()
+    coaster_store.invalidate(restaurant_id=restaurant_id)
+    dashboard_feed.touch_restaurant(restaurant_id)
+
+    return {
+        "restaurant_id": restaurant_id,
+        "tables_created": len(table_rows),
+        "bierdeckel_created": len(bierdeckel_rows),
+        "tables": result
+    }
+
+# Grundriss als JSON importieren
+@router.post("/restaurant/{restaurant_id}/layout")
+def import_layout_json(restaurant_id: str, data: LayoutImport, db: Session = Depends(get_db)):
+    return import_layout(db, restaurant_id, data.tables)
+
+# Grundriss als CSV importieren (Spalten: table_number,seats,label – eine Zeile pro Bierdeckel)
+@router.post("/restaurant/{restaurant_id}/layout/csv")
+def import_layout_csv(restaurant_id: str, file: UploadFile = File(...), db: Session = Depends(get_db)):
+    try:
+        text = file.file.read().decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV muss UTF-8 kodiert sein")
+
+    tables = {}
+    for line, row in enumerate(csv.DictReader(io.StringIO(text)), start=2):
+        try:
+            number = int(row["table_number"])
+            seats = int(row.get("seats") or 4)
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail=f"Ungültige CSV-Zeile {line}")
+
+        table = tables.get(number)
+        if table is None:
+            table = tables[number] = LayoutTable(table_number=number, seats=seats)
+        label = (row.get("label") or "").strip()
+        if label:
+            table.bierdeckel.append(label)
+
+    return import_layout(db, restaurant_id, list(tables.values()))
@@ -0,0 +1,103 @@
+# Lasttest für gleichzeitige Zahlungen (Versions-Vergleich auf session_balances, 409).
+#
+# Server im selben Verzeichnis (gleiche bierdeckel.db) mit mehreren Workern starten:
+#   gunicorn main:app -w 4 -k uvicorn.workers.UvicornWorker -b 127.0.0.1:8000
+# dann aus backend/:
+#   python -m scripts.load_test_payments --rounds 10
+#
+# Pro Runde scannen 6 Gäste (Seed-Bierdeckel bd-001 bis bd-006), bilden eine
+# Gruppe, bestellen und rufen alle gleichzeitig /pay und /pay-group auf. Danach
+# muss jede Session genau ihren Betrag bezahlt haben (nicht mehr, nicht weniger)
+# und die Salden müssen zu Bestellungen und Zahlungen passen.
+import argparse
+import json
+import sys
+import threading
+import urllib.error
+import urllib.request
+from collections import Counter
+from sqlalchemy import func
+from database.db import SessionLocal
+from models.order import Order
+from models.payment import Payment
+from services.balance import reconcile
+
+def call(base_url, method, path, data=None):
+    body = json.dumps(data).encode() if data is not None else None
+    request = urllib.request.Request(base_url + path, data=body, method=method,
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, json.loads(response.read() or "null")
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+def run_round(base_url, restaurant_id, bierdeckel_ids, menu_item_id, codes):
+    sessions = [call(base_url, "POST", f"/r/{restaurant_id}/bd/{bd}/scan")[1]["session_id"] for bd in bierdeckel_ids]
+    invite_code = call(base_url, "POST", f"/session/{sessions[0]}/create-group")[1]["invite_code"]
+    for session_id in sessions[1:]:
+        call(base_url, "POST", f"/session/{session_id}/join/{invite_code}")
+    for session_id in sessions:
+        call(base_url, "POST", f"/session/{session_id}/order", {"items": [{"menu_item_id": menu_item_id, "quantity": 2}]})
+
+    # Alle Zahlungen einer Runde starten im selben Moment
+    barrier = threading.Barrier(len(sessions) * 2)
+    def payer(path):
+        barrier.wait()
+        status, _ = call(base_url, "POST", path)
+        codes[status] += 1
+
+    threads = [
+        threading.Thread(target=payer, args=(f"/session/{session_id}/{action}",))
+        for session_id in sessions for action in ("pay", "pay-group")
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for session_id in sessions:
+        call(base_url, "PUT", f"/session/{session_id}/close")
+    return sessions
+
+# Sessions, deren abgeschlossene Zahlungen nicht genau der Bestellsumme entsprechen
+def wrongly_paid(db, session_ids):
+    totals = dict(db.query(Order.session_id, func.sum(Order.total)).filter(
+        Order.session_id.in_(session_ids)
+    ).group_by(Order.session_id).all())
+    paid = dict(db.query(Payment.session_id, func.sum(Payment.amount)).filter(
+        Payment.session_id.in_(session_ids),
+        Payment.status == "completed"
+    ).group_by(Payment.session_id).all())
+    return [s for s in session_ids if abs((totals.get(s) or 0) - (paid.get(s) or 0)) > 0.005]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gleichzeitige Einzel- und Gruppenzahlungen gegen einen laufenden Server")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--restaurant", default="restaurant-001")
+    parser.add_argument("--bierdeckel", nargs="+", default=[f"bd-00{i}" for i in range(1, 7)])
+    args = parser.parse_args()
+
+    status, menu = call(args.url, "GET", f"/restaurant/{args.restaurant}/menu")
+    if status != 200:
+        sys.exit(f"Menü nicht erreichbar ({status}) – läuft der Server unter {args.url}?")
+    menu_item_id = next(item["id"] for items in menu.values() for item in items)
+
+    codes = Counter()
+    session_ids = []
+    for _ in range(args.rounds):
+        session_ids += run_round(args.url, args.restaurant, args.bierdeckel, menu_item_id, codes)
+
+    db = SessionLocal()
+    try:
+        wrong = wrongly_paid(db, session_ids)
+        payments = db.query(Payment).filter(Payment.session_id.in_(session_ids)).count()
+        checked, mismatches = reconcile(db)
+    finally:
+        db.close()
+
+    print(f"Antworten: {dict(codes)}")
+    print(f"{len(session_ids)} Sessions, {payments} Zahlungen, falsch bezahlt: {len(wrong)}")
+    print(f"Salden geprüft: {checked}, Abweichungen: {len(mismatches)}")
+    if wrong or mismatches:
+        sys.exit(1)
@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+from sqlalchemy.orm import Session
+from models.session import TableSession
+from models.menu import MenuItem
+from models.order import Order
+from services.bus import bus
+
+# Vollständiges Neuladen als Absicherung, falls ein Bus-Ereignis verloren geht
+REFRESH_INTERVAL = float(os.environ.get("AUTO_ORDER_INDEX_REFRESH", "30"))
+
+OPEN_STATUSES = ("pending", "preparing")
+# Auto-Bestellungen: beim Leerwerden und vorab per Prognose angelegt
+AUTO_ORDER_SOURCES = ("auto_order", "auto_prequeue")
+
+class AutoOrderEntry:
+    __slots__ = ("session_id", "bierdeckel_id", "menu_item_id", "item_name", "price", "open_order", "glass_served")
+
+    def __init__(self, session_id, bierdeckel_id, menu_item_id, item_name, price, open_order=False):
+        self.session_id = session_id
+        self.bierdeckel_id = bierdeckel_id
+        self.menu_item_id = menu_item_id
+        self.item_name = item_name
+        self.price = price
+        self.open_order = open_order
+        # Für das aktuelle Glas wurde schon vorab nachbestellt: auch nach der
+        # Lieferung kein zweites Mal, bis ein neues Glas steht
+        self.glass_served = False
+
+    @property
+    def ready(self):
+        return not self.open_order and not self.glass_served
+
+# Bierdeckel-ID -> aktive Auto-Bestellung (Session, Getränk, Preis, offene Bestellung)
+class AutoOrderIndex:
+    def __init__(self):
+        self._by_bierdeckel = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _reload(self, db: Session):
+        rows = db.query(TableSession, MenuItem).join(
+            MenuItem, MenuItem.id == TableSession.auto_order_item_id
+        ).filter(
+            TableSession.is_active == True,
+            TableSession.auto_order == True
+        ).all()
+
+        session_ids = [s.id for s, _ in rows]
+        open_ids = set()
+        if session_ids:
+            open_ids = {
+                session_id for (session_id,) in db.query(Order.session_id).filter(
+                    Order.session_id.in_(session_ids),
+                    Order.source.in_(AUTO_ORDER_SOURCES),
+                    Order.status.in_(OPEN_STATUSES)
+                ).distinct()
+            }
+
+        entries = {
+            s.bierdeckel_id: AutoOrderEntry(
+                s.id, s.bierdeckel_id, item.id, item.name, item.price, s.id in open_ids
+            )
+            for s, item in rows
+        }
+        with self._lock:
+            for bierdeckel_id, entry in entries.items():
+                old = self._by_bierdeckel.get(bierdeckel_id)
+                if old and old.session_id == entry.session_id:
+                    entry.glass_served = old.glass_served
+            self._by_bierdeckel = entries
+            self._loaded_at = time.monotonic()
+
+    def ensure_loaded(self, db: Session):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > REFRESH_INTERVAL:
+            self._reload(db)
+
+    # Einträge für leere Bierdeckel ohne offene (oder für dieses Glas schon
+    # gelieferte) Auto-Bestellung, als offen markiert
+    def claim(self, db: Session, bierdeckel_ids):
+        self.ensure_loaded(db)
+        claimed = []
+        with self._lock:
+            for bierdeckel_id in bierdeckel_ids:
+                entry = self._by_bierdeckel.get(bierdeckel_id)
+                if entry and entry.ready:
+                    entry.open_order = True
+                    claimed.append(entry)
+        return claimed
+
+    # Bierdeckel mit aktiver Auto-Bestellung, aber ohne offene Bestellung
+    def waiting(self, db: Session, bierdeckel_ids):
+        self.ensure_loaded(db)
+        with self._lock:
+            return [
+                i for i in bierdeckel_ids
+                if i in self._by_bierdeckel and self._by_bierdeckel[i].ready
+            ]
+
+    # Neues Glas (Gewichtssprung oder Glas weg): Vorab-Bestellung wieder erlaubt,
+    # geht nur über den Bus, wenn hier eine markiert ist
+    def new_glass(self, bierdeckel_ids):
+        with self._lock:
+            served = [
+                i for i in bierdeckel_ids
+                if i in self._by_bierdeckel and self._by_bierdeckel[i].glass_served
+            ]
+        if served:
+            bus.publish("auto_order_glass", served)
+
+    def on_new_glass(self, seq, bierdeckel_ids):
+        with self._lock:
+            for bierdeckel_id in bierdeckel_ids:
+                entry = self._by_bierdeckel.get(bierdeckel_id)
+                if entry:
+                    entry.glass_served = False
+
+    def release(self, entries):
+        with self._lock:
+            for entry in entries:
+                entry.open_order = False
+
+    # Die anderen Worker laden nach einer Änderung neu (hier ist der Stand schon aktuell)
+    def invalidate_others(self):
+        bus.publish("auto_order_index", None, local=False)
+
+    def on_invalidate(self, seq, payload):
+        self._loaded_at = None
+
+    # Offene Auto-Bestellungen aus dem Bus (auch aus anderen Workern) mitführen
+    def on_orders(self, seq, entries):
+        for entry in entries:
+            if entry["source"] in AUTO_ORDER_SOURCES:
+                self.set_open(entry["session_id"], entry["status"] in OPEN_STATUSES)
+            # Nur beim Anlegen; die Lieferung kann nach dem Glaswechsel kommen
+            if entry["source"] == "auto_prequeue" and entry["status"] == "pending":
+                self.set_glass_served(entry["session_id"])
+
+    def enable(self, session: TableSession, menu_item: MenuItem, open_order=False):
+        with self._lock:
+            self._by_bierdeckel[session.bierdeckel_id] = AutoOrderEntry(
+                session.id, session.bierdeckel_id, menu_item.id, menu_item.name, menu_item.price, open_order
+            )
+        self.invalidate_others()
+
+    def disable(self, session_id):
+        with self._lock:
+            for bierdeckel_id, entry in list(self._by_bierdeckel.items()):
+                if entry.session_id == session_id:
+                    del self._by_bierdeckel[bierdeckel_id]
+        self.invalidate_others()
+
+    def set_open(self, session_id, open_order):
+        with self._lock:
+            for entry in self._by_bierdeckel.values():
+                if entry.session_id == session_id:
+                    entry.open_order = open_order
+
+    def set_glass_served(self, session_id):
+        with self._lock:
+            for entry in self._by_bierdeckel.values():
+                if entry.session_id == session_id:
+                    entry.glass_served = True
+
+    def update_item(self, menu_item: MenuItem):
+        with self._lock:
+            for entry in self._by_bierdeckel.values():
+                if entry.menu_item_id == menu_item.id:
+                    entry.item_name = menu_item.name
+                    entry.price = menu_item.price
+        self.invalidate_others()
+
+    def remove_item(self, menu_item_id):
+        with self._lock:
+            for bierdeckel_id, entry in list(self._by_bierdeckel.items()):
+                if entry.menu_item_id == menu_item_id:
+                    del self._by_bierdeckel[bierdeckel_id]
+        self.invalidate_others()
+
+auto_order_index = AutoOrderIndex()
+bus.subscribe("auto_order_index", auto_order_index.on_invalidate)
+bus.subscribe("orders", auto_order_index.on_orders)
+bus.subscribe("auto_order_glass", auto_order_index.on_new_glass)
@@ -0,0 +1,179 @@
+import argparse
+import os
+import random
+import time
+from sqlalchemy import func, case
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+from models.balance import SessionBalance
+from models.order import Order
+from models.payment import Payment
+from models.session import TableSession
+
+# Abweichungen unter einem halben Cent sind Rundung
+TOLERANCE = 0.005
+# Versuche bei gleichzeitigen Zahlungen, danach 409
+SETTLE_RETRIES = int(os.environ.get("SETTLE_RETRIES", "3"))
+
+class Balance:
+    __slots__ = ("session_id", "total", "paid", "version", "stored")
+
+    def __init__(self, session_id, total, paid, version=0, stored=False):
+        self.session_id = session_id
+        self.total = total or 0
+        self.paid = paid or 0
+        self.version = version
+        self.stored = stored  # Zeile existiert in session_balances
+
+    @property
+    def remaining(self):
+        return self.total - self.paid
+
+# Stand aus Bestellungen und Zahlungen neu berechnen (zwei gruppierte Abfragen)
+def recompute(db: Session, session_ids):
+    session_ids = list(session_ids)
+    if not session_ids:
+        return {}
+    totals = dict(db.query(Order.session_id, func.sum(Order.total)).filter(
+        Order.session_id.in_(session_ids)
+    ).group_by(Order.session_id).all())
+    paid = dict(db.query(Payment.session_id, func.sum(Payment.amount)).filter(
+        Payment.session_id.in_(session_ids),
+        Payment.status == "completed"
+    ).group_by(Payment.session_id).all())
+    return {
+        session_id: Balance(session_id, totals.get(session_id), paid.get(session_id))
+        for session_id in session_ids
+    }
+
+def get_balances(db: Session, session_ids):
+    session_ids = list(dict.fromkeys(session_ids))
+    if not session_ids:
+        return {}
+    result = {
+        b.session_id: Balance(b.session_id, b.total, b.paid, b.version, stored=True)
+        for b in db.query(SessionBalance).filter(SessionBalance.session_id.in_(session_ids))
+    }
+    # Sessions von vor der Einführung: ohne Schreiben berechnen
+    missing = [s for s in session_ids if s not in result]
+    result.update(recompute(db, missing))
+    return result
+
+def get_balance(db: Session, session_id) -> Balance:
+    return get_balances(db, [session_id])[session_id]
+
+# Beträge atomar in der laufenden Transaktion verbuchen (vor dem Commit aufrufen),
+# ein UPDATE für alle Sessions. totals/paid: session_id -> Betrag.
+# Fehlende Zeilen werden aus den (schon geflushten) Daten angelegt.
+def book_many(db: Session, totals=None, paid=None):
+    totals = totals or {}
+    paid = paid or {}
+    session_ids = set(totals) | set(paid)
+    if not session_ids:
+        return
+
+    values = {SessionBalance.version: SessionBalance.version + 1}
+    if totals:
+        values[SessionBalance.total] = SessionBalance.total + case(totals, value=SessionBalance.session_id, else_=0)
+    if paid:
+        values[SessionBalance.paid] = SessionBalance.paid + case(paid, value=SessionBalance.session_id, else_=0)
+    updated = db.query(SessionBalance).filter(
+        SessionBalance.session_id.in_(session_ids)
+    ).update(values, synchronize_session=False)
+
+    if updated < len(session_ids):
+        existing = {s for (s,) in db.query(SessionBalance.session_id).filter(
+            SessionBalance.session_id.in_(session_ids)
+        )}
+        db.flush()
+        for balance in recompute(db, session_ids - existing).values():
+            db.add(SessionBalance(session_id=balance.session_id, total=balance.total, paid=balance.paid, version=1))
+
+def book(db: Session, session_id, total=0, paid=0):
+    book_many(db, {session_id: total}, {session_id: paid})
+
+# Zahlungen gegen gelesene Salden verbuchen, nur wenn sich keiner seitdem
+# geändert hat (Version wie gelesen). Fehlende Zeilen werden angelegt, ein
+# gleichzeitiges Anlegen scheitert am Primärschlüssel. False = Konflikt,
+# der Aufrufer rollt zurück und liest neu.
+def settle(db: Session, balances, paid):
+    expected = {b.session_id: b.version for b in balances if b.stored}
+    try:
+        if expected:
+            updated = db.query(SessionBalance).filter(
+                SessionBalance.session_id.in_(expected),
+                SessionBalance.version == case(expected, value=SessionBalance.session_id)
+            ).update({
+                SessionBalance.paid: SessionBalance.paid + case(paid, value=SessionBalance.session_id, else_=0),
+                SessionBalance.version: SessionBalance.version + 1
+            }, synchronize_session=False)
+            if updated != len(expected):
+                return False
+        for b in balances:
+            if not b.stored:
+                db.add(SessionBalance(
+                    session_id=b.session_id, total=b.total, paid=b.paid + paid.get(b.session_id, 0), version=1
+                ))
+        db.flush()
+    except (IntegrityError, OperationalError):
+        # Doppelte Zeile oder DB gesperrt durch den anderen Zahler
+        return False
+    return True
+
+# Kurze zufällige Pause vor dem nächsten Versuch, damit sich gleichzeitige
+# Zahler nicht wieder treffen
+def retry_pause(attempt):
+    time.sleep(random.uniform(0.005, 0.02) * (attempt + 1))
+
+def open_balance(db: Session, session_id):
+    db.add(SessionBalance(session_id=session_id, total=0, paid=0, version=0))
+
+# Alle Stände neu berechnen und vergleichen, mit fix=True korrigieren
+def reconcile(db: Session, fix=False):
+    session_ids = [s for (s,) in db.query(TableSession.id)]
+    stored = {b.session_id: b for b in db.query(SessionBalance)}
+    expected = recompute(db, session_ids)
+
+    mismatches = []
+    for session_id, balance in expected.items():
+        row = stored.get(session_id)
+        if row and abs(row.total - balance.total) <= TOLERANCE and abs(row.paid - balance.paid) <= TOLERANCE:
+            continue
+        mismatches.append({
+            "session_id": session_id,
+            "stored_total": row.total if row else None,
+            "stored_paid": row.paid if row else None,
+            "total": balance.total,
+            "paid": balance.paid
+        })
+        if fix:
+            if row:
+                row.total = balance.total
+                row.paid = balance.paid
+                row.version += 1
+            else:
+                db.add(SessionBalance(session_id=session_id, total=balance.total, paid=balance.paid, version=1))
+    if fix:
+        db.commit()
+    return len(expected), mismatches
+
+# Aufruf aus backend/: python -m services.balance [--fix]
+if __name__ == "__main__":
+    from database.db import SessionLocal, Base, engine
+    Base.metadata.create_all(bind=engine, tables=[SessionBalance.__table__])
+
+    parser = argparse.ArgumentParser(description="Session-Salden aus Bestellungen und Zahlungen neu berechnen")
+    parser.add_argument("--fix", action="store_true", help="Abweichende Salden überschreiben")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        checked, mismatches = reconcile(db, fix=args.fix)
+    finally:
+        db.close()
+    for m in mismatches:
+        print(f"{m['session_id']}: gespeichert {m['stored_total']} / {m['stored_paid']}, "
+              f"berechnet {m['total']:.2f} / {m['paid']:.2f}")
+    print(f"{checked} Sessions geprüft, {len(mismatches)} Abweichungen"
+          + (" korrigiert" if args.fix and mismatches else ""))
+    raise SystemExit(1 if mismatches and not args.fix else 0)
@@ -0,0 +1,144 @@
+import asyncio
+import itertools
+import json
+import os
+import time
+import uuid
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, Text, Float, insert, select, delete, func, text, event
+
+# "local": nur innerhalb eines Prozesses (ein Worker),
+# "sqlite": über die Tabelle bus_events an alle Worker
+EVENT_BUS = os.environ.get("EVENT_BUS", "local")
+# Eigene Datei wie beim Gewichtsverlauf: Ereignisse schreiben sperrt nicht die Haupt-DB
+EVENT_BUS_URL = os.environ.get("EVENT_BUS_URL", "sqlite:///event_bus.db")
+POLL_INTERVAL = float(os.environ.get("EVENT_BUS_POLL", "0.2"))
+RETENTION = float(os.environ.get("EVENT_BUS_RETENTION", "300"))
+PRUNE_INTERVAL = 60
+POLL_BATCH = 1000
+
+# Ereignisse (kind, payload) an alle Handler verteilen. Jeder Handler bekommt
+# (seq, payload); seq steigt mit jedem Ereignis und ist bei "sqlite" in allen
+# Workern gleich.
+class LocalBus:
+    def __init__(self):
+        # Gehört zu jeder seq: nur Positionen derselben instance sind vergleichbar
+        self.instance = uuid.uuid4().hex[:12]
+        # Letzte seq vor dem Start: alles bis hier steckt schon im geladenen Stand
+        self.start_seq = 0
+        self._handlers = {}
+        self._seq = itertools.count(1)
+
+    def subscribe(self, kind, handler):
+        self._handlers.setdefault(kind, []).append(handler)
+
+    # local=False: nur an die anderen Prozesse (z. B. zum Invalidieren von Caches,
+    # die hier schon aktuell sind)
+    def publish(self, kind, payload, local=True):
+        if local:
+            self.dispatch(next(self._seq), kind, payload)
+
+    def dispatch(self, seq, kind, payload):
+        for handler in self._handlers.get(kind, ()):
+            try:
+                handler(seq, payload)
+            except Exception as e:
+                print(f"Event-Bus: {kind} fehlgeschlagen: {e}")
+
+    def start(self):
+        return None
+
+metadata = MetaData()
+
+# Ereignisse zwischen den Workern, werden nach RETENTION Sekunden gelöscht.
+# AUTOINCREMENT: IDs werden nach dem Löschen nie wiederverwendet
+bus_events = Table(
+    "bus_events", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("origin", String, nullable=False),  # Prozess, der das Ereignis gesendet hat
+    Column("kind", String, nullable=False),
+    Column("payload", Text, nullable=False),  # JSON
+    Column("created_at", Float, nullable=False, index=True),  # Unix-Zeit
+    sqlite_autoincrement=True
+)
+
+def create_bus_engine(url):
+    bus_engine = create_engine(url, connect_args={"check_same_thread": False})
+
+    @event.listens_for(bus_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    metadata.create_all(bind=bus_engine)
+    return bus_engine
+
+# Ereignisse landen in bus_events, jeder Worker liest neue Zeilen alle
+# POLL_INTERVAL Sekunden und verteilt die der anderen Prozesse bei sich
+class SqliteBus(LocalBus):
+    def __init__(self):
+        super().__init__()
+        self.instance = "db"
+        self.origin = uuid.uuid4().hex
+        self.engine = create_bus_engine(EVENT_BUS_URL)
+        self._last_id = 0
+        self._last_prune = 0
+
+    def publish(self, kind, payload, local=True):
+        with self.engine.begin() as conn:
+            seq = conn.execute(insert(bus_events).values(
+                origin=self.origin,
+                kind=kind,
+                payload=json.dumps(payload, default=str),
+                created_at=time.time()
+            )).inserted_primary_key[0]
+        if local:
+            self.dispatch(seq, kind, payload)
+
+    def poll(self):
+        now = time.time()
+        with self.engine.begin() as conn:
+            rows = conn.execute(
+                select(bus_events.c.id, bus_events.c.origin, bus_events.c.kind, bus_events.c.payload)
+                .where(bus_events.c.id > self._last_id).order_by(bus_events.c.id).limit(POLL_BATCH)
+            ).all()
+            if now - self._last_prune > PRUNE_INTERVAL:
+                conn.execute(delete(bus_events).where(bus_events.c.created_at < now - RETENTION))
+                self._last_prune = now
+
+        for seq, origin, kind, payload in rows:
+            self._last_id = seq
+            if origin != self.origin:
+                self.dispatch(seq, kind, json.loads(payload))
+        return len(rows)
+
+    async def run(self):
+        while True:
+            try:
+                received = await asyncio.to_thread(self.poll)
+            except Exception as e:
+                print(f"Event-Bus: Abfrage fehlgeschlagen: {e}")
+                received = 0
+            if received < POLL_BATCH:
+                await asyncio.sleep(POLL_INTERVAL)
+
+    # Erst ab jetzt lesen, ältere Ereignisse sind schon in der DB sichtbar.
+    # start_seq ist die höchste je vergebene ID, auch wenn alle Zeilen schon
+    # gelöscht sind: so fängt kein Worker wieder bei 0 an.
+    def start(self):
+        with self.engine.connect() as conn:
+            self._last_id = conn.execute(select(func.max(bus_events.c.id))).scalar() or 0
+            self.start_seq = conn.execute(
+                text("SELECT seq FROM sqlite_sequence WHERE name = :name"), {"name": bus_events.name}
+            ).scalar() or self._last_id
+        return asyncio.create_task(self.run())
+
+BACKENDS = {"local": LocalBus, "sqlite": SqliteBus}
+if EVENT_BUS not in BACKENDS:
+    raise ValueError(f"Unbekannter EVENT_BUS: {EVENT_BUS} (erlaubt: {', '.join(BACKENDS)})")
+
+bus = BACKENDS[EVENT_BUS]()
+
+def start_event_bus():
+    return bus.start()
@@ -0,0 +1,190 @@
+import asyncio
+import os
+import threading
+import time
+from sqlalchemy.orm import Session
+from database.db import SessionLocal
+from models.bierdeckel import Bierdeckel
+from models.table import Table
+from services.status_machine import StatusDebouncer
+from services.bus import bus
+
+# Gewichte ohne Statuswechsel werden gesammelt alle paar Sekunden geschrieben
+FLUSH_INTERVAL = float(os.environ.get("COASTER_FLUSH_INTERVAL", "5"))
+# So lange gilt ein aus der DB geladener Stand, danach wird nachgeladen
+# (andere Worker schreiben ihre Messungen ebenfalls in die DB)
+REFRESH_INTERVAL = float(os.environ.get("COASTER_REFRESH_INTERVAL", "5"))
+
+IN_CHUNK_SIZE = 500
+
+class CoasterState:
+    __slots__ = (
+        "id", "label", "table_id", "restaurant_id", "table_number", "qr_code",
+        "weight", "status", "last_updated", "last_reading_at", "version", "flushed_version", "debouncer"
+    )
+
+    def __init__(self, bd: Bierdeckel, table_number):
+        self.id = bd.id
+        self.label = bd.label
+        self.table_id = bd.table_id
+        self.restaurant_id = bd.restaurant_id
+        self.table_number = table_number
+        self.qr_code = bd.qr_code
+        self.weight = bd.weight
+        self.status = bd.status
+        self.last_updated = bd.last_updated
+        self.last_reading_at = bd.last_reading_at
+        self.version = 0
+        self.flushed_version = 0
+        self.debouncer = StatusDebouncer(bd.status)
+
+    @property
+    def dirty(self):
+        return self.version != self.flushed_version
+
+    def mapping(self):
+        return {
+            "id": self.id,
+            "weight": self.weight,
+            "status": self.status,
+            "last_updated": self.last_updated,
+            "last_reading_at": self.last_reading_at
+        }
+
+class CoasterStateStore:
+    def __init__(self):
+        self._states = {}
+        self._loaded_at = {}  # ("restaurant"|"table", id) -> Zeitpunkt
+        self._lock = threading.Lock()
+
+    def _load(self, db: Session, *criteria):
+        rows = db.query(Bierdeckel, Table.table_number).outerjoin(
+            Table, Table.id == Bierdeckel.table_id
+        ).filter(*criteria).all()
+
+        with self._lock:
+            for bd, table_number in rows:
+                state = self._states.get(bd.id)
+                if state is None:
+                    self._states[bd.id] = CoasterState(bd, table_number)
+                    continue
+                state.label = bd.label
+                state.table_number = table_number
+                state.qr_code = bd.qr_code
+                # Neuerer Stand aus der DB (anderer Worker) gewinnt
+                if not state.dirty and bd.last_updated and (
+                    not state.last_updated or bd.last_updated >= state.last_updated
+                ):
+                    # Debouncer nur bei anderem Status ersetzen, sonst ginge ein
+                    # laufender Kandidat bei jedem Nachladen verloren
+                    if bd.status != state.status:
+                        state.debouncer = StatusDebouncer(bd.status)
+                    state.weight = bd.weight
+                    state.status = bd.status
+                    state.last_updated = bd.last_updated
+                    state.last_reading_at = bd.last_reading_at
+            return [self._states[bd.id] for bd, _ in rows]
+
+    def _scope(self, db: Session, key, column, value):
+        now = time.monotonic()
+        loaded = self._loaded_at.get(key)
+        if loaded is None or now - loaded > REFRESH_INTERVAL:
+            states = self._load(db, column == value)
+            self._loaded_at[key] = now
+            return states
+        with self._lock:
+            return [s for s in self._states.values() if getattr(s, column.key) == value]
+
+    def get_many(self, db: Session, ids):
+        ids = list(ids)
+        with self._lock:
+            found = {i: self._states[i] for i in ids if i in self._states}
+        missing = [i for i in ids if i not in found]
+        for i in range(0, len(missing), IN_CHUNK_SIZE):
+            for state in self._load(db, Bierdeckel.id.in_(missing[i:i + IN_CHUNK_SIZE])):
+                found[state.id] = state
+        return found
+
+    def all(self):
+        with self._lock:
+            return list(self._states.values())
+
+    def for_restaurant(self, db: Session, restaurant_id):
+        return self._scope(db, ("restaurant", restaurant_id), Bierdeckel.restaurant_id, restaurant_id)
+
+    def for_table(self, db: Session, table_id):
+        return self._scope(db, ("table", table_id), Bierdeckel.table_id, table_id)
+
+    # Neue Messung übernehmen; der Status wechselt erst, wenn er stabil ist.
+    # received_at: Empfangszeit (time.monotonic), auf ihr läuft die Wartezeit
+    def apply(self, state: CoasterState, weight, now, received_at=None):
+        with self._lock:
+            state.weight = weight
+            state.status = state.debouncer.update(weight, received_at if received_at is not None else time.monotonic())
+            state.last_updated = now
+            state.last_reading_at = now
+            state.version += 1
+            return state.version
+
+    # Status, deren Kandidat seit der letzten Messung lange genug anliegt,
+    # übernehmen. now: time.monotonic() wie beim Empfang. Gibt (Stand, Version) zurück.
+    def promote_due(self, now):
+        promoted = []
+        with self._lock:
+            for state in self._states.values():
+                if state.debouncer.candidate is None:
+                    continue
+                status = state.debouncer.promote(now)
+                if status != state.status:
+                    state.status = status
+                    state.version += 1
+                    promoted.append((state, state.version))
+        return promoted
+
+    def mark_flushed(self, versions):
+        with self._lock:
+            for state, version in versions:
+                if state.flushed_version < version:
+                    state.flushed_version = version
+
+    # Neue oder geänderte Bierdeckel: in allen Workern beim nächsten Zugriff nachladen
+    def invalidate(self, restaurant_id=None, table_id=None):
+        bus.publish("coaster_store", {"restaurant_id": restaurant_id, "table_id": table_id})
+
+    def on_invalidate(self, seq, payload):
+        with self._lock:
+            self._loaded_at.pop(("restaurant", payload["restaurant_id"]), None)
+            self._loaded_at.pop(("table", payload["table_id"]), None)
+
+    # Alle geänderten Gewichte in einer Transaktion schreiben
+    def flush(self):
+        with self._lock:
+            pending = [(s, s.version, s.mapping()) for s in self._states.values() if s.dirty]
+        if not pending:
+            return 0
+
+        db = SessionLocal()
+        try:
+            db.bulk_update_mappings(Bierdeckel, [m for _, _, m in pending])
+            db.commit()
+        finally:
+            db.close()
+        self.mark_flushed([(s, v) for s, v, _ in pending])
+        return len(pending)
+
+coaster_store = CoasterStateStore()
+bus.subscribe("coaster_store", coaster_store.on_invalidate)
+
+async def run_flusher():
+    try:
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await asyncio.to_thread(coaster_store.flush)
+            except Exception as e:
+                print(f"Bierdeckel-Flush fehlgeschlagen: {e}")
+    finally:
+        coaster_store.flush()
+
+def start_coaster_flusher():
+    return asyncio.create_task(run_flusher())
@@ -0,0 +1,236 @@
+import asyncio
+import os
+import threading
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from database.db import SessionLocal
+from models.session import TableSession
+from models.table import Table
+from models.order import Order
+from models.payment import Payment
+from models.service_call import ServiceCall
+from services.balance import get_balances
+from services.events import hub
+from services.bus import bus
+
+# Geänderte Tische werden gesammelt und so oft an das Dashboard geschickt
+FEED_INTERVAL = float(os.environ.get("DASHBOARD_FEED_INTERVAL", "0.25"))
+# Gewichtsänderung (Gramm), ab der ein Bierdeckel ohne Statuswechsel gesendet wird
+COASTER_MIN_CHANGE = float(os.environ.get("DASHBOARD_COASTER_MIN_CHANGE", "25"))
+
+def restaurant_topic(restaurant_id):
+    return f"restaurant/{restaurant_id}"
+
+# Tische mit aktiven Sessions und Zählern aus wenigen gruppierten Abfragen,
+# table_ids schränkt auf einzelne Tische ein
+def dashboard_tables(db: Session, restaurant_id, table_ids=None):
+    criteria = [Table.restaurant_id == restaurant_id]
+    if table_ids is not None:
+        criteria.append(Table.id.in_(list(table_ids)))
+    rows = db.query(Table.id, Table.table_number, TableSession.id, TableSession.created_at).outerjoin(
+        TableSession, (TableSession.table_id == Table.id) & (TableSession.is_active == True)
+    ).filter(*criteria).order_by(Table.table_number, TableSession.created_at).all()
+    session_ids = [session_id for _, _, session_id, _ in rows if session_id]
+
+    open_orders = {}
+    open_requests = {}
+    balances = {}
+    if session_ids:
+        open_orders = dict(db.query(Order.session_id, func.count(Order.id)).filter(
+            Order.session_id.in_(session_ids),
+            Order.status != "delivered"
+        ).group_by(Order.session_id).all())
+        open_requests = dict(db.query(ServiceCall.session_id, func.count(ServiceCall.id)).filter(
+            ServiceCall.session_id.in_(session_ids),
+            ServiceCall.status != "done"
+        ).group_by(ServiceCall.session_id).all())
+        balances = get_balances(db, session_ids)
+
+    tables = {}
+    for table_id, table_number, session_id, created_at in rows:
+        table_data = tables.get(table_id)
+        if table_data is None:
+            table_data = tables[table_id] = {
+                "table_number": table_number,
+                "table_id": table_id,
+                "active_guests": 0,
+                "sessions": []
+            }
+        if session_id is None:
+            continue
+
+        balance = balances[session_id]
+        table_data["active_guests"] += 1
+        table_data["sessions"].append({
+            "session_id": session_id,
+            "open_orders": open_orders.get(session_id, 0),
+            "total": balance.total,
+            "paid": balance.paid,
+            "remaining": balance.remaining,
+            "open_service_requests": open_requests.get(session_id, 0),
+            "created_at": str(created_at)
+        })
+    return list(tables.values())
+
+# Offene Zahlungswünsche aktiver Sessions mit Tischnummer in einer Abfrage
+def payment_requests(db: Session, restaurant_id):
+    rows = db.query(Payment, Table.table_number).join(
+        TableSession, TableSession.id == Payment.session_id
+    ).outerjoin(
+        Table, Table.id == TableSession.table_id
+    ).filter(
+        TableSession.restaurant_id == restaurant_id,
+        TableSession.is_active == True,
+        Payment.status == "requested"
+    ).order_by(Payment.created_at).all()
+
+    return [
+        {
+            "payment_id": p.id,
+            "session_id": p.session_id,
+            "table_number": table_number,
+            "amount": p.amount,
+            "status": p.status,
+            "created_at": str(p.created_at)
+        }
+        for p, table_number in rows
+    ]
+
+def coaster_entry(state):
+    return {
+        "bierdeckel_id": state.id,
+        "label": state.label,
+        "table_number": state.table_number,
+        "weight": state.weight,
+        "status": state.status,
+        "last_updated": str(state.last_updated)
+    }
+
+# Stand pro Restaurant für ETags: Position (seq) des letzten Bus-Ereignisses,
+# das das Restaurant betraf. Mit EVENT_BUS=sqlite in allen Workern gleich.
+# Schwaches ETag: Gewichte unter COASTER_MIN_CHANGE ändern den Stand nicht.
+class ChangeVersions:
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def advance(self, restaurant_id, seq):
+        with self._lock:
+            if seq > self._versions.get(restaurant_id, bus.start_seq):
+                self._versions[restaurant_id] = seq
+
+    # Ohne Änderung seit dem Start gilt die Bus-Position beim Start: ein neuer
+    # Worker meldet so nie eine Version, die ein anderer für einen älteren Stand vergeben hat
+    def etag(self, restaurant_id):
+        return f'W/"{bus.instance}-{self._versions.get(restaurant_id, bus.start_seq)}"'
+
+dashboard_versions = ChangeVersions()
+
+# Änderungen für die Dashboards der Restaurants. Schreibende Stellen melden nach
+# dem Commit nur die betroffenen Sessions (über den Bus an alle Worker), jeder
+# Worker lädt die Tische gesammelt nach und schickt sie an seine Verbindungen.
+class DashboardFeed:
+    def __init__(self):
+        self._pending = {}  # session_id -> (seq, {"payments"})
+        self._restaurants = {}  # restaurant_id -> seq, Tische/Bierdeckel angelegt
+        self._coasters = {}  # bierdeckel_id -> (weight, status) zuletzt gesendet
+        self._coaster_changes = {}  # bierdeckel_id -> Änderung für den nächsten flush
+        self._lock = threading.Lock()
+
+    def touch(self, session_ids, *kinds):
+        session_ids = list(session_ids)
+        if session_ids:
+            bus.publish("dashboard", {"sessions": session_ids, "kinds": list(kinds)})
+
+    # Neue Tische oder Bierdeckel: Dashboards bekommen den kompletten Stand neu
+    def touch_restaurant(self, restaurant_id):
+        bus.publish("dashboard", {"sessions": [], "kinds": [], "restaurants": [restaurant_id]})
+
+    def mark(self, seq, session_ids, *kinds):
+        with self._lock:
+            for session_id in session_ids:
+                last_seq, pending_kinds = self._pending.get(session_id, (0, set()))
+                self._pending[session_id] = (max(seq, last_seq), pending_kinds | set(kinds))
+
+    def on_touch(self, seq, payload):
+        self.mark(seq, payload["sessions"], *payload["kinds"])
+        with self._lock:
+            for restaurant_id in payload.get("restaurants", []):
+                self._restaurants[restaurant_id] = max(seq, self._restaurants.get(restaurant_id, 0))
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            restaurants, self._restaurants = self._restaurants, {}
+            coaster_changes, self._coaster_changes = self._coaster_changes, {}
+        # Ein Bus-Ereignis pro Durchlauf für alle Bierdeckel dieses Workers
+        if coaster_changes:
+            bus.publish("coasters", list(coaster_changes.values()))
+        if not pending and not restaurants:
+            return 0
+
+        db = SessionLocal()
+        try:
+            for restaurant_id, seq in restaurants.items():
+                dashboard_versions.advance(restaurant_id, seq)
+                topic = restaurant_topic(restaurant_id)
+                if hub.has_subscribers(topic):
+                    # snapshot importiert dieses Modul
+                    from services.snapshot import snapshot_events
+                    for event, data in snapshot_events(restaurant_id):
+                        hub.publish(topic, event, data)
+
+            rows = db.query(TableSession.id, TableSession.restaurant_id, TableSession.table_id).filter(
+                TableSession.id.in_(list(pending))
+            ).all()
+            changes = {}
+            for session_id, restaurant_id, table_id in rows:
+                seq, session_kinds = pending[session_id]
+                table_ids, kinds, last_seq = changes.get(restaurant_id, (set(), set(), 0))
+                table_ids.add(table_id)
+                changes[restaurant_id] = (table_ids, kinds | session_kinds, max(seq, last_seq))
+
+            for restaurant_id, (table_ids, kinds, seq) in changes.items():
+                dashboard_versions.advance(restaurant_id, seq)
+                topic = restaurant_topic(restaurant_id)
+                if restaurant_id in restaurants or not hub.has_subscribers(topic):
+                    continue
+                hub.publish(topic, "tables", dashboard_tables(db, restaurant_id, table_ids))
+                if "payments" in kinds:
+                    hub.publish(topic, "payment_requests", payment_requests(db, restaurant_id))
+        finally:
+            db.close()
+        return len(pending) + len(restaurants)
+
+    # Bierdeckel beim nächsten flush senden, aber nur bei Statuswechsel oder
+    # deutlicher Gewichtsänderung; mehrere Messungen dazwischen ergeben eine Änderung
+    def coasters(self, states):
+        with self._lock:
+            for state in states:
+                last = self._coasters.get(state.id)
+                if last is not None and last[1] == state.status and abs(state.weight - last[0]) < COASTER_MIN_CHANGE:
+                    continue
+                self._coasters[state.id] = (state.weight, state.status)
+                self._coaster_changes[state.id] = {"restaurant_id": state.restaurant_id, "coaster": coaster_entry(state)}
+
+    def on_coasters(self, seq, changed):
+        for change in changed:
+            dashboard_versions.advance(change["restaurant_id"], seq)
+            topic = restaurant_topic(change["restaurant_id"])
+            if hub.has_subscribers(topic):
+                hub.publish(topic, "coaster", change["coaster"])
+
+dashboard_feed = DashboardFeed()
+bus.subscribe("dashboard", dashboard_feed.on_touch)
+bus.subscribe("coasters", dashboard_feed.on_coasters)
+
+async def run_dashboard_feed():
+    while True:
+        await asyncio.sleep(FEED_INTERVAL)
+        try:
+            await asyncio.to_thread(dashboard_feed.flush)
+        except Exception as e:
+            print(f"Dashboard-Feed fehlgeschlagen: {e}")
+
+def start_dashboard_feed():
+    return asyncio.create_task(run_dashboard_feed())
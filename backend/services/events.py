@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+import threading
+from contextlib import asynccontextmanager
+from fastapi.responses import StreamingResponse
+from services.bus import bus
+
+# Ohne Ereignis wird nach so vielen Sekunden ein Kommentar gesendet,
+# damit Proxys die Verbindung nicht schließen
+HEARTBEAT_INTERVAL = float(os.environ.get("SSE_HEARTBEAT", "15"))
+# Ungelesene Ereignisse pro Verbindung; wer nicht hinterherkommt, wird getrennt
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+class Subscription:
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def push(self, item):
+        try:
+            self.loop.call_soon_threadsafe(self._put, item)
+        except RuntimeError:
+            # Event-Loop schon beendet
+            pass
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+# Verteilt Ereignisse an offene Verbindungen dieses Prozesses, publish ist aus
+# jedem Thread erlaubt
+class EventHub:
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, topic, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscription in subscribers:
+            subscription.push((event, data))
+
+    def has_subscribers(self, topic):
+        with self._lock:
+            return topic in self._subscribers
+
+    @asynccontextmanager
+    async def subscribe(self, topic):
+        subscription = Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(topic)
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+hub = EventHub()
+
+# Ereignis an die Verbindungen aller Worker (hub.publish erreicht nur diesen
+# Prozess), mehrere Topics gehen als ein Bus-Ereignis raus
+def publish_event(topics, event, data):
+    if isinstance(topics, str):
+        topics = [topics]
+    if topics:
+        bus.publish("event", {"topics": list(topics), "event": event, "data": data})
+
+def deliver_event(seq, payload):
+    for topic in payload["topics"]:
+        hub.publish(topic, payload["event"], payload["data"])
+
+bus.subscribe("event", deliver_event)
+
+def sse_format(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+# Erst abonnieren, dann den Anfangsstand laden, damit kein Ereignis verloren geht.
+# snapshot: Funktion (läuft im Threadpool) -> Liste von (event, data)
+async def sse_events(topic, snapshot):
+    async with hub.subscribe(topic) as subscription:
+        for event, data in await asyncio.to_thread(snapshot):
+            yield sse_format(event, data)
+        while not subscription.overflowed:
+            try:
+                event, data = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield sse_format(event, data)
+
+def sse_response(topic, snapshot):
+    return StreamingResponse(
+        sse_events(topic, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models.idempotency import IdempotencyKey
+
+# Wie lange eine Wiederholung die erste Antwort bekommt
+TTL = float(os.environ.get("IDEMPOTENCY_TTL", "86400"))
+CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "10000"))
+MAX_KEY_LENGTH = 200
+PRUNE_INTERVAL = 3600
+
+def request_hash(data) -> str:
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+# Antworten zu Idempotency-Keys: Einträge liegen in der DB (gleiche Transaktion
+# wie die Bestellung/Zahlung, gilt also für alle Worker), davor ein LRU-Cache
+class IdempotencyStore:
+    def __init__(self, ttl=TTL, size=CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_prune = 0
+
+    def scoped(self, header, scope):
+        if header is None:
+            return None
+        if not header or len(header) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail="Ungültiger Idempotency-Key")
+        return f"{scope}:{header}"
+
+    def _remember(self, key, fingerprint, response):
+        with self._lock:
+            self._cache[key] = (time.time() + self.ttl, fingerprint, response)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+
+    def _check(self, stored_fingerprint, fingerprint, response):
+        if stored_fingerprint != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key wurde mit anderen Daten verwendet")
+        return response
+
+    # Gespeicherte Antwort zu einem Schlüssel oder None
+    def lookup(self, db: Session, key, fingerprint):
+        if key is None:
+            return None
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                if cached[0] > time.time():
+                    self._cache.move_to_end(key)
+                    return self._check(cached[1], fingerprint, cached[2])
+                del self._cache[key]
+
+        row = db.query(IdempotencyKey).filter(
+            IdempotencyKey.key == key,
+            IdempotencyKey.created_at >= datetime.utcnow() - timedelta(seconds=self.ttl)
+        ).first()
+        if not row:
+            return None
+        response = json.loads(row.response)
+        self._remember(key, row.request_hash, response)
+        return self._check(row.request_hash, fingerprint, response)
+
+    # Antwort zusammen mit den offenen Änderungen committen. Kam eine parallele
+    # Anfrage mit demselben Schlüssel zuvor, wird zurückgerollt und deren Antwort
+    # geliefert – Aufrufer erkennen das an "is not response".
+    def commit(self, db: Session, key, fingerprint, response):
+        if key is None:
+            db.commit()
+            return response
+
+        # Abgelaufener Eintrag mit demselben Schlüssel (noch nicht aufgeräumt):
+        # gilt als neue Anfrage, sonst scheitert das INSERT am Primärschlüssel
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.key == key,
+            IdempotencyKey.created_at < datetime.utcnow() - timedelta(seconds=self.ttl)
+        ).delete(synchronize_session=False)
+        db.add(IdempotencyKey(
+            key=key,
+            request_hash=fingerprint,
+            response=json.dumps(response, default=str)
+        ))
+        self._prune(db)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            stored = self.lookup(db, key, fingerprint)
+            if stored is None:
+                raise
+            return stored
+        self._remember(key, fingerprint, response)
+        return response
+
+    def _prune(self, db: Session):
+        now = time.time()
+        if now - self._last_prune < PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.created_at < datetime.utcnow() - timedelta(seconds=self.ttl)
+        ).delete(synchronize_session=False)
+
+idempotency = IdempotencyStore()
@@ -0,0 +1,180 @@
+from sqlalchemy import insert, literal, select
+from sqlalchemy.orm import Session
+from datetime import datetime
+from database.db import SessionLocal
+from models.bierdeckel import Bierdeckel
+from models.order import Order, OrderItem
+from services.coaster_state import coaster_store
+from services.weight_history import weight_history
+from services.auto_order_index import auto_order_index, AUTO_ORDER_SOURCES, OPEN_STATUSES
+from services.refill_predictor import refill_predictor, REFILL_JUMP
+from services.sensor_health import sensor_health
+from services.order_queue import order_queue, order_entry
+from services.balance import book
+from services.dashboard import dashboard_feed
+import asyncio
+import os
+import time
+import uuid
+
+# So oft werden Statuswechsel geprüft, die ohne neue Messung stabil geworden sind
+PROMOTE_INTERVAL = float(os.environ.get("COASTER_PROMOTE_INTERVAL", "0.5"))
+
+# Auto-Bestellung nur anlegen, wenn die Session keine offene hat. Prüfung und
+# Insert in einer Anweisung: SQLite sperrt dafür die Datenbank, zwei Worker
+# können so nicht beide einfügen. Gibt die neue Order-ID zurück oder None.
+def insert_auto_order(db: Session, entry, source, created_at):
+    order_id = str(uuid.uuid4())
+    open_auto = select(Order.id).where(
+        Order.session_id == entry.session_id,
+        Order.source.in_(AUTO_ORDER_SOURCES),
+        Order.status.in_(OPEN_STATUSES)
+    ).exists()
+    values = select(
+        literal(order_id), literal(entry.session_id), literal(entry.price),
+        literal("pending"), literal(source), literal(created_at)
+    ).where(~open_auto)
+    result = db.execute(insert(Order.__table__).from_select(
+        ["id", "session_id", "total", "status", "source", "created_at"], values
+    ))
+    return order_id if result.rowcount else None
+
+# Auto-Bestellungen für leere (und bald leere) Bierdeckel anlegen,
+# Daten kommen aus dem Index. prequeue: bierdeckel_id -> erwartete Leerzeit.
+# queued: Einträge für die Thekenanzeige, nach dem Commit zu veröffentlichen
+def create_auto_orders(db: Session, empty_ids, prequeue=None):
+    prequeue = prequeue or {}
+    if not empty_ids and not prequeue:
+        return {}, [], []
+
+    claimed = auto_order_index.claim(db, list(empty_ids) + list(prequeue))
+    coasters = coaster_store.get_many(db, [entry.bierdeckel_id for entry in claimed]) if claimed else {}
+    created_at = datetime.utcnow()
+    fired = {}
+    queued = []
+    for entry in claimed:
+        empty_at = prequeue.get(entry.bierdeckel_id)
+        source = "auto_prequeue" if empty_at else "auto_order"
+        order_id = insert_auto_order(db, entry, source, created_at)
+        if order_id is None:
+            # Ein anderer Worker war schneller, seine Bestellung ist offen
+            print(f"Auto-Bestellung für Session {entry.session_id} schon vorhanden")
+            continue
+
+        db.add(OrderItem(
+            order_id=order_id,
+            menu_item_id=entry.menu_item_id,
+            quantity=1,
+            price=entry.price
+        ))
+        book(db, entry.session_id, total=entry.price)
+        fired[entry.bierdeckel_id] = order_id
+        if empty_at:
+            refill_predictor.mark_prequeued(order_id, entry.session_id, empty_at)
+            print(f"Auto-Bestellung (vorab): {entry.item_name} für Session {entry.session_id}")
+        else:
+            print(f"Auto-Bestellung: {entry.item_name} für Session {entry.session_id}")
+
+        coaster = coasters.get(entry.bierdeckel_id)
+        if coaster:
+            queued.append(order_entry(
+                order_id, coaster.restaurant_id, entry.session_id, coaster.table_number,
+                [{"name": entry.item_name, "quantity": 1}], entry.price, "pending", source, created_at
+            ))
+
+    return fired, claimed, queued
+
+# Stabile Statuswechsel schreiben und Auto-Bestellungen auslösen.
+# versions: bierdeckel_id -> Version des Stands, refilled: Bierdeckel mit neuem Glas
+def commit_status_changes(db: Session, changed, versions, refilled=(), prequeue=None):
+    # Neues Glas: nachgefüllt oder abgeräumt
+    auto_order_index.new_glass(set(refilled) | {s.id for s in changed if s.status == "no_glass"})
+    # Auto-Bestellung nur beim Wechsel auf "leer", nicht bei jeder Messung
+    empty_ids = [s.id for s in changed if s.status == "empty"]
+    fired, claimed, queued = create_auto_orders(db, empty_ids, prequeue)
+
+    try:
+        if changed:
+            db.bulk_update_mappings(Bierdeckel, [s.mapping() for s in changed])
+        if changed or fired:
+            db.commit()
+    except Exception:
+        db.rollback()
+        auto_order_index.release(claimed)
+        raise
+    coaster_store.mark_flushed([(s, versions[s.id]) for s in changed])
+    order_queue.push(queued)
+    return fired
+
+# Gewichtsmessungen übernehmen: Stand im Speicher, geschrieben wird nur
+# bei stabilem Statuswechsel (sonst später vom Flusher).
+# readings: (bierdeckel_id, weight) oder (bierdeckel_id, weight, unix_ts)
+def apply_weight_updates(db: Session, readings):
+    readings = list(readings)
+    states = coaster_store.get_many(db, {r[0] for r in readings})
+    before = {bid: state.status for bid, state in states.items()}
+    now = datetime.utcnow()
+    received_at = time.time()
+    received_mono = time.monotonic()
+
+    versions = {}
+    refilled = set()
+    for reading in readings:
+        state = states.get(reading[0])
+        if state:
+            ts = reading[2] if len(reading) > 2 and reading[2] is not None else received_at
+            if reading[1] - state.weight > REFILL_JUMP:
+                refilled.add(state.id)
+            versions[state.id] = coaster_store.apply(state, reading[1], now, received_mono)
+            weight_history.record(state.id, ts, reading[1])
+            refill_predictor.observe(state.id, ts, reading[1], state.status)
+            sensor_health.record(state.id, received_at)
+
+    changed = [s for s in states.values() if s.status != before[s.id]]
+    # Prognose nur für volle Gläser mit aktiver, noch nicht ausgelöster Auto-Bestellung
+    waiting = auto_order_index.waiting(db, [s.id for s in states.values() if s.status == "full"])
+    prequeue = refill_predictor.due(waiting, received_at)
+    fired = commit_status_changes(db, changed, versions, refilled, prequeue)
+    dashboard_feed.coasters(states.values())
+
+    results = []
+    not_found = []
+    for bierdeckel_id in dict.fromkeys(r[0] for r in readings):
+        state = states.get(bierdeckel_id)
+        if not state:
+            not_found.append(bierdeckel_id)
+            continue
+        results.append({
+            "bierdeckel_id": state.id,
+            "weight": state.weight,
+            "status": state.status,
+            "last_updated": str(state.last_updated),
+            "auto_ordered": state.id in fired,
+            "auto_order_id": fired.get(state.id)
+        })
+    return results, not_found
+
+# Statuswechsel, die ohne weitere Messung stabil geworden sind
+def promote_statuses():
+    promoted = coaster_store.promote_due(time.monotonic())
+    if not promoted:
+        return 0
+    db = SessionLocal()
+    try:
+        changed = [state for state, _ in promoted]
+        commit_status_changes(db, changed, {state.id: version for state, version in promoted})
+    finally:
+        db.close()
+    dashboard_feed.coasters(changed)
+    return len(promoted)
+
+async def run_status_promoter():
+    while True:
+        await asyncio.sleep(PROMOTE_INTERVAL)
+        try:
+            await asyncio.to_thread(promote_statuses)
+        except Exception as e:
+            print(f"Statuswechsel fehlgeschlagen: {e}")
+
+def start_status_promoter():
+    return asyncio.create_task(run_status_promoter())
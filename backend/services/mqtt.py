@@ -0,0 +1,285 @@
+import asyncio
+import json
+import os
+import struct
+import tempfile
+from database.db import SessionLocal
+from services.ingest import apply_weight_updates
+
+try:
+    import fcntl
+except ImportError:  # Windows: kein flock, Entwicklung läuft mit einem Prozess
+    fcntl = None
+
+# Konfiguration (ohne MQTT_BROKER bleibt der Subscriber aus)
+MQTT_BROKER = os.environ.get("MQTT_BROKER")
+MQTT_PORT = int(os.environ.get("MQTT_PORT", "1883"))
+MQTT_TOPIC = os.environ.get("MQTT_TOPIC", "bierdeckel/+/weight")
+MQTT_CLIENT_ID = os.environ.get("MQTT_CLIENT_ID", f"bierdeckel-backend-{os.getpid()}")
+MQTT_USERNAME = os.environ.get("MQTT_USERNAME")
+MQTT_PASSWORD = os.environ.get("MQTT_PASSWORD")
+MQTT_KEEPALIVE = 30
+MQTT_LOCK_FILE = os.environ.get(
+    "MQTT_LOCK_FILE", os.path.join(tempfile.gettempdir(), "bierdeckel-mqtt.lock")
+)
+
+# Messungen werden gesammelt und als Batch geschrieben
+BATCH_MAX_SIZE = 500
+BATCH_WINDOW = 0.05
+
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+PUBACK = 0x40
+SUBSCRIBE = 0x82
+SUBACK = 0x90
+PINGREQ = 0xC0
+PINGRESP = 0xD0
+
+class MqttError(Exception):
+    pass
+
+# --- MQTT 3.1.1 Kodierung ---
+
+def encode_length(length: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        out.append(byte)
+        if not length:
+            return bytes(out)
+
+def encode_string(value: str) -> bytes:
+    data = value.encode()
+    return struct.pack("!H", len(data)) + data
+
+def packet(header: int, body: bytes = b"") -> bytes:
+    return bytes([header]) + encode_length(len(body)) + body
+
+def connect_packet(client_id, username=None, password=None, keepalive=MQTT_KEEPALIVE) -> bytes:
+    flags = 0x02  # clean session
+    payload = encode_string(client_id)
+    if username:
+        flags |= 0x80
+        payload += encode_string(username)
+        if password:
+            flags |= 0x40
+            payload += encode_string(password)
+    body = encode_string("MQTT") + bytes([4, flags]) + struct.pack("!H", keepalive) + payload
+    return packet(CONNECT, body)
+
+def subscribe_packet(packet_id: int, topic: str, qos: int = 1) -> bytes:
+    return packet(SUBSCRIBE, struct.pack("!H", packet_id) + encode_string(topic) + bytes([qos]))
+
+async def read_packet(reader: asyncio.StreamReader):
+    header = (await reader.readexactly(1))[0]
+    length, multiplier = 0, 1
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        length += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            break
+        multiplier *= 128
+        if multiplier > 128 ** 3:
+            raise MqttError("Ungültige Paketlänge")
+    body = await reader.readexactly(length) if length else b""
+    return header, body
+
+def parse_publish(header: int, body: bytes):
+    qos = (header >> 1) & 0x03
+    topic_len = struct.unpack("!H", body[:2])[0]
+    topic = body[2:2 + topic_len].decode()
+    pos = 2 + topic_len
+    packet_id = None
+    if qos:
+        packet_id = struct.unpack("!H", body[pos:pos + 2])[0]
+        pos += 2
+    return topic, body[pos:], qos, packet_id
+
+# --- Sensor-Frames ---
+
+# Topic bierdeckel/<id>/weight mit Zahl oder JSON als Payload
+# (JSON darf bierdeckel_id und timestamp in Unix-Sekunden enthalten)
+def decode_frame(topic: str, payload: bytes):
+    try:
+        text = payload.decode().strip()
+        data = json.loads(text) if text.startswith("{") else {"weight": text}
+        parts = topic.split("/")
+        bierdeckel_id = data.get("bierdeckel_id") or (parts[1] if len(parts) >= 2 else None)
+        if not bierdeckel_id:
+            return None
+        ts = data.get("timestamp")
+        return str(bierdeckel_id), float(data["weight"]), float(ts) if ts is not None else None
+    except (UnicodeDecodeError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+def store_readings(readings):
+    db = SessionLocal()
+    try:
+        results, not_found = apply_weight_updates(db, readings)
+        if not_found:
+            print(f"MQTT: unbekannte Bierdeckel {not_found}")
+        return results
+    finally:
+        db.close()
+
+# --- Subscriber ---
+
+class MqttSubscriber:
+    def __init__(self, host, port=1883, topic=MQTT_TOPIC, client_id=MQTT_CLIENT_ID,
+                 username=None, password=None, handler=None, keepalive=MQTT_KEEPALIVE):
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.client_id = client_id
+        self.username = username
+        self.password = password
+        self.handler = handler or (lambda readings: asyncio.to_thread(store_readings, readings))
+        self.keepalive = keepalive
+        self.queue = asyncio.Queue(maxsize=BATCH_MAX_SIZE * 20)
+        self.connected = asyncio.Event()
+        self.pong = asyncio.Event()
+
+    async def run(self):
+        consumer = asyncio.create_task(self.consume())
+        backoff = 1
+        try:
+            while True:
+                try:
+                    await self.listen()
+                    backoff = 1
+                except (OSError, asyncio.IncompleteReadError, MqttError) as e:
+                    print(f"MQTT: Verbindung verloren ({e}), neuer Versuch in {backoff}s")
+                except Exception as e:
+                    print(f"MQTT: unerwarteter Fehler ({e!r}), neuer Versuch in {backoff}s")
+                self.connected.clear()
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+        finally:
+            consumer.cancel()
+
+    async def listen(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(connect_packet(self.client_id, self.username, self.password, self.keepalive))
+            await writer.drain()
+            header, body = await read_packet(reader)
+            if header != CONNACK or len(body) < 2 or body[1] != 0:
+                raise MqttError("Verbindung vom Broker abgelehnt")
+
+            writer.write(subscribe_packet(1, self.topic))
+            await writer.drain()
+
+            # Endet einer der beiden (Fehler oder keine Antwort auf PINGREQ),
+            # wird die Verbindung getrennt und neu aufgebaut
+            tasks = [asyncio.create_task(self.receive(reader, writer)), asyncio.create_task(self.ping(writer))]
+            try:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            finally:
+                for task in tasks:
+                    task.cancel()
+        finally:
+            writer.close()
+
+    async def receive(self, reader, writer):
+        while True:
+            header, body = await read_packet(reader)
+            kind = header & 0xF0
+            if kind == PUBLISH:
+                # Ein kaputtes Paket kostet nicht die Verbindung
+                try:
+                    await self.on_publish(header, body, writer)
+                except (struct.error, UnicodeDecodeError) as e:
+                    print(f"MQTT: fehlerhaftes Paket verworfen ({e})")
+            elif kind == PINGRESP:
+                self.pong.set()
+            elif kind == SUBACK:
+                if not body or body[-1] == 0x80:
+                    raise MqttError(f"Abo für {self.topic} abgelehnt")
+                self.connected.set()
+                print(f"MQTT: abonniert {self.topic} auf {self.host}:{self.port}")
+
+    # PUBACK erst, wenn die Messung verarbeitet ist (siehe consume); Frames, die
+    # sich nicht lesen lassen, sofort bestätigen, sonst kämen sie immer wieder
+    async def on_publish(self, header, body, writer):
+        topic, payload, qos, packet_id = parse_publish(header, body)
+        ack = (writer, packet_id) if qos == 1 else None
+        reading = decode_frame(topic, payload)
+        if reading:
+            await self.queue.put((reading, ack))
+        elif ack:
+            send_puback(*ack)
+
+    # Alle keepalive/2 Sekunden ein PINGREQ; kommt innerhalb von keepalive/2 kein
+    # PINGRESP, gilt die Verbindung als tot (halb offene TCP-Verbindung)
+    async def ping(self, writer):
+        while True:
+            await asyncio.sleep(self.keepalive / 2)
+            self.pong.clear()
+            writer.write(packet(PINGREQ))
+            await writer.drain()
+            try:
+                await asyncio.wait_for(self.pong.wait(), self.keepalive / 2)
+            except asyncio.TimeoutError:
+                raise MqttError("keine Antwort auf PINGREQ")
+
+    # Messungen sammeln und gebündelt an die Ingest-Logik geben, danach bestätigen
+    async def consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + BATCH_WINDOW
+            while len(batch) < BATCH_MAX_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self.handler([reading for reading, _ in batch])
+            except Exception as e:
+                print(f"MQTT: Fehler beim Speichern ({e})")
+            for _, ack in batch:
+                if ack:
+                    send_puback(*ack)
+
+# Auf einer inzwischen getrennten Verbindung nicht mehr bestätigen
+def send_puback(writer, packet_id):
+    if not writer.is_closing():
+        writer.write(packet(PUBACK, struct.pack("!H", packet_id)))
+
+_lock_file = None
+
+# Nur ein Worker pro Host abonniert, sonst würden Messungen mehrfach verarbeitet
+def acquire_lock():
+    if fcntl is None:
+        return True
+    global _lock_file
+    _lock_file = open(MQTT_LOCK_FILE, "w")
+    try:
+        fcntl.flock(_lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        _lock_file.close()
+        _lock_file = None
+        return False
+
+def start_mqtt_subscriber():
+    if not MQTT_BROKER:
+        return None
+    if not acquire_lock():
+        print("MQTT: Subscriber läuft bereits in einem anderen Worker")
+        return None
+
+    subscriber = MqttSubscriber(
+        MQTT_BROKER, MQTT_PORT, MQTT_TOPIC, MQTT_CLIENT_ID,
+        MQTT_USERNAME, MQTT_PASSWORD
+    )
+    return asyncio.create_task(subscriber.run())
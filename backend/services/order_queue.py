@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from sqlalchemy.orm import Session
+from database.db import SessionLocal
+from models.order import Order, OrderItem
+from models.menu import MenuItem
+from models.session import TableSession
+from models.table import Table
+from services.events import hub
+from services.bus import bus
+from services.dashboard import dashboard_feed, restaurant_topic
+from services.session_events import session_topic
+from services.refill_predictor import refill_predictor
+
+# Vollständiges Neuladen als Absicherung gegen Bestellungen aus anderen Workern
+REFRESH_INTERVAL = float(os.environ.get("ORDER_QUEUE_REFRESH", "30"))
+
+# Kleinere Zahl = weiter vorne. Bei "auto_order" steht schon ein leeres Glas
+# auf dem Tisch, Vorbestellungen haben noch den Vorlauf der Prognose.
+PRIORITY = {"auto_order": 0, "manual": 1, "auto_prequeue": 2}
+DEFAULT_PRIORITY = 1
+
+def bar_topic(restaurant_id):
+    return f"bar/{restaurant_id}"
+
+def queue_key(entry):
+    return (entry["priority"], entry["created_at"])
+
+def order_entry(order_id, restaurant_id, session_id, table_number, items, total, status, source, created_at):
+    source = source or "manual"
+    return {
+        "order_id": order_id,
+        "restaurant_id": restaurant_id,
+        "session_id": session_id,
+        "table_number": table_number,
+        "items": items,
+        "total": total,
+        "status": status,
+        "source": source,
+        "priority": PRIORITY.get(source, DEFAULT_PRIORITY),
+        "predicted_empty_at": refill_predictor.prequeued_eta(order_id),
+        "created_at": str(created_at)
+    }
+
+# Bestellungen mit Tisch und Artikeln in zwei Abfragen laden
+def load_orders(db: Session, *criteria):
+    rows = db.query(Order, TableSession.restaurant_id, Table.table_number).join(
+        TableSession, TableSession.id == Order.session_id
+    ).join(
+        Table, Table.id == TableSession.table_id
+    ).filter(*criteria).order_by(Order.created_at).all()
+
+    items_by_order = {order.id: [] for order, _, _ in rows}
+    if items_by_order:
+        items = db.query(OrderItem.order_id, OrderItem.quantity, MenuItem.name).outerjoin(
+            MenuItem, MenuItem.id == OrderItem.menu_item_id
+        ).filter(OrderItem.order_id.in_(list(items_by_order))).all()
+        for order_id, quantity, name in items:
+            items_by_order[order_id].append({
+                "name": name or "Unbekannt",
+                "quantity": quantity
+            })
+
+    return [
+        order_entry(
+            order.id, restaurant_id, order.session_id, table_number, items_by_order[order.id],
+            order.total, order.status, order.source, order.created_at
+        )
+        for order, restaurant_id, table_number in rows
+    ]
+
+def open_orders(db: Session, restaurant_id):
+    return load_orders(
+        db,
+        TableSession.restaurant_id == restaurant_id,
+        TableSession.is_active == True,
+        Order.status != "delivered"
+    )
+
+# Offene Bestellungen pro Restaurant für die Theke, Änderungen gehen per Hub raus
+class OrderQueue:
+    def __init__(self):
+        self._queues = {}
+        self._loaded_at = {}
+        self._lock = threading.Lock()
+
+    def _reload(self, db: Session, restaurant_id):
+        entries = {e["order_id"]: e for e in open_orders(db, restaurant_id)}
+        with self._lock:
+            self._queues[restaurant_id] = entries
+            self._loaded_at[restaurant_id] = time.monotonic()
+
+    def entries(self, db: Session, restaurant_id):
+        loaded_at = self._loaded_at.get(restaurant_id)
+        if loaded_at is None or time.monotonic() - loaded_at > REFRESH_INTERVAL:
+            self._reload(db, restaurant_id)
+        with self._lock:
+            return sorted(self._queues[restaurant_id].values(), key=queue_key)
+
+    # Neue oder geänderte Bestellungen übernehmen (erst nach dem Commit aufrufen),
+    # geht über den Bus an alle Worker
+    def push(self, entries):
+        if entries:
+            bus.publish("orders", entries)
+
+    # In jedem Worker: eigene Liste aktualisieren, Theke, Dashboard und Gast benachrichtigen
+    def apply(self, seq, entries):
+        for entry in entries:
+            restaurant_id = entry["restaurant_id"]
+            with self._lock:
+                queue = self._queues.get(restaurant_id)
+                if queue is not None:
+                    if entry["status"] == "delivered":
+                        queue.pop(entry["order_id"], None)
+                    else:
+                        queue[entry["order_id"]] = entry
+            hub.publish(bar_topic(restaurant_id), "order", entry)
+            hub.publish(restaurant_topic(restaurant_id), "order", entry)
+            hub.publish(session_topic(entry["session_id"]), "order", entry)
+        dashboard_feed.mark(seq, [entry["session_id"] for entry in entries])
+
+    def set_status(self, db: Session, order_id, status):
+        self.set_statuses(db, [order_id], status)
+
+    # Statuswechsel mehrerer Bestellungen, unbekannte mit einer Abfrage nachladen
+    def set_statuses(self, db: Session, order_ids, status):
+        entries = []
+        missing = []
+        with self._lock:
+            for order_id in order_ids:
+                for queue in self._queues.values():
+                    if order_id in queue:
+                        entries.append(dict(queue[order_id], status=status))
+                        break
+                else:
+                    missing.append(order_id)
+        if missing:
+            entries.extend(load_orders(db, Order.id.in_(missing)))
+        self.push(entries)
+
+    def snapshot(self, restaurant_id):
+        db = SessionLocal()
+        try:
+            return [("queue", self.entries(db, restaurant_id))]
+        finally:
+            db.close()
+
+order_queue = OrderQueue()
+bus.subscribe("orders", order_queue.apply)
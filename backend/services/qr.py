@@ -0,0 +1,106 @@
+import hashlib
+import io
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import qrcode
+
+QR_CACHE_SIZE = int(os.environ.get("QR_CACHE_SIZE", "2048"))
+# Pro Server-Worker (WEB_CONCURRENCY wie bei Gunicorn): die Worker teilen sich die CPUs
+SERVER_WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+QR_PROCESSES = int(os.environ.get("QR_PROCESSES", str(max(1, (os.cpu_count() or 2) // SERVER_WORKERS))))
+# Kleine Mengen lohnen den Prozess-Pool nicht
+POOL_THRESHOLD = 8
+
+def render_png(url: str) -> bytes:
+    buffer = io.BytesIO()
+    qrcode.make(url).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def etag_for(*parts) -> str:
+    digest = hashlib.sha1("\x1f".join(str(p) for p in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(if_none_match, etag) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+# PNGs nach Inhalt (QR-URL) zwischenspeichern
+class QrCache:
+    def __init__(self, size=QR_CACHE_SIZE):
+        self.size = size
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _get(self, url):
+        with self._lock:
+            png = self._images.get(url)
+            if png is not None:
+                self._images.move_to_end(url)
+            return png
+
+    def _put(self, url, png):
+        with self._lock:
+            self._images[url] = png
+            self._images.move_to_end(url)
+            while len(self._images) > self.size:
+                self._images.popitem(last=False)
+
+    def png(self, url: str) -> bytes:
+        png = self._get(url)
+        if png is None:
+            png = render_png(url)
+            self._put(url, png)
+        return png
+
+    # Viele QR-Codes auf einmal, fehlende parallel im Prozess-Pool rendern
+    def png_many(self, urls):
+        result = {}
+        missing = []
+        for url in dict.fromkeys(urls):
+            png = self._get(url)
+            if png is None:
+                missing.append(url)
+            else:
+                result[url] = png
+
+        pool = self._pool
+        if len(missing) >= POOL_THRESHOLD and pool is not None:
+            rendered = zip(missing, pool.map(render_png, missing, chunksize=16))
+        else:
+            rendered = ((url, render_png(url)) for url in missing)
+        for url, png in rendered:
+            self._put(url, png)
+            result[url] = png
+        return result
+
+    # Der Pool lebt mit der App (main.py lifespan); ohne Pool wird im Prozess gerendert
+    def start_pool(self):
+        with self._lock:
+            if self._pool is None and QR_PROCESSES > 1:
+                self._pool = ProcessPoolExecutor(max_workers=QR_PROCESSES)
+
+    def shutdown_pool(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+qr_cache = QrCache()
+
+# ZIP mit einem PNG pro Bierdeckel, sortiert nach Tisch
+def build_qr_zip(coasters) -> bytes:
+    coasters = [bd for bd in coasters if bd.qr_code]
+    images = qr_cache.png_many(bd.qr_code for bd in coasters)
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for bd in sorted(coasters, key=lambda b: (b.table_number or 0, b.label)):
+            name = f"Tisch-{bd.table_number}/{bd.label}-{bd.id[:8]}.png"
+            archive.writestr(name, images[bd.qr_code])
+    return buffer.getvalue()
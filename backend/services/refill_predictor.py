@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+from collections import deque
+from services.status_machine import NO_GLASS_BELOW, EMPTY_BELOW
+
+# Vorlauf, mit dem eine Auto-Bestellung vor dem Leerwerden angelegt wird (0 = aus)
+LEAD_TIME = float(os.environ.get("AUTO_ORDER_LEAD_TIME", "90"))
+# Zeitraum der Messungen für die Trinkgeschwindigkeit
+WINDOW = float(os.environ.get("REFILL_WINDOW", "120"))
+MIN_POINTS = 5
+MIN_SPAN = 20  # Sekunden, sonst ist die Steigung nur Rauschen
+# Anstieg um so viel Gramm bedeutet: neues Glas / nachgefüllt
+REFILL_JUMP = 50
+# Unter dieser Rate (g/s) wird nicht getrunken
+MIN_RATE = 0.05
+# Vorhersagen für Vorab-Bestellungen werden spätestens so lange nach der
+# erwarteten Leerzeit vergessen (nie geliefert, Session in anderem Worker beendet)
+PREQUEUE_TTL = float(os.environ.get("REFILL_PREQUEUE_TTL", "3600"))
+
+class ConsumptionEstimator:
+    __slots__ = ("points",)
+
+    def __init__(self):
+        self.points = deque()
+
+    def add(self, ts, weight):
+        if self.points and weight - self.points[-1][1] > REFILL_JUMP:
+            self.points.clear()
+        self.points.append((ts, weight))
+        while self.points and ts - self.points[0][0] > WINDOW:
+            self.points.popleft()
+
+    # Lineare Regression Gewicht über Zeit, Ergebnis: Zeitpunkt von "leer"
+    def predict_empty_at(self):
+        n = len(self.points)
+        if n < MIN_POINTS or self.points[-1][0] - self.points[0][0] < MIN_SPAN:
+            return None
+
+        mean_t = sum(t for t, _ in self.points) / n
+        mean_w = sum(w for _, w in self.points) / n
+        var_t = sum((t - mean_t) ** 2 for t, _ in self.points)
+        if var_t == 0:
+            return None
+        slope = sum((t - mean_t) * (w - mean_w) for t, w in self.points) / var_t
+        if slope > -MIN_RATE:
+            return None
+
+        last_t = self.points[-1][0]
+        fitted = mean_w + slope * (last_t - mean_t)
+        return last_t + (EMPTY_BELOW - fitted) / slope
+
+class RefillPredictor:
+    def __init__(self, lead_time=LEAD_TIME):
+        self.lead_time = lead_time
+        self._estimators = {}
+        self._prequeued = {}  # order_id -> (session_id, vorhergesagter Zeitpunkt (Unix))
+        self._lock = threading.Lock()
+
+    # Messung eines vollen Glases aufnehmen (angehobenes Glas zählt nicht)
+    def observe(self, bierdeckel_id, ts, weight, status):
+        with self._lock:
+            if status != "full":
+                self._estimators.pop(bierdeckel_id, None)
+                return
+            if weight < NO_GLASS_BELOW:
+                return
+            estimator = self._estimators.get(bierdeckel_id)
+            if estimator is None:
+                estimator = self._estimators[bierdeckel_id] = ConsumptionEstimator()
+            estimator.add(ts, weight)
+
+    # Sekunden bis "leer", gemessen ab der letzten Messung
+    def seconds_until_empty(self, bierdeckel_id):
+        with self._lock:
+            estimator = self._estimators.get(bierdeckel_id)
+            if not estimator:
+                return None
+            empty_at = estimator.predict_empty_at()
+            if empty_at is None:
+                return None
+            return max(0, empty_at - estimator.points[-1][0])
+
+    # Bierdeckel, deren Glas innerhalb des Vorlaufs leer sein wird -> Unix-Zeit
+    def due(self, bierdeckel_ids, now):
+        if self.lead_time <= 0:
+            return {}
+        result = {}
+        for bierdeckel_id in bierdeckel_ids:
+            remaining = self.seconds_until_empty(bierdeckel_id)
+            if remaining is not None and remaining <= self.lead_time:
+                result[bierdeckel_id] = now + remaining
+        return result
+
+    def mark_prequeued(self, order_id, session_id, empty_at):
+        with self._lock:
+            self._prune(time.time())
+            self._prequeued[order_id] = (session_id, empty_at)
+
+    def _prune(self, now):
+        expired = [o for o, (_, empty_at) in self._prequeued.items() if now - empty_at > PREQUEUE_TTL]
+        for order_id in expired:
+            del self._prequeued[order_id]
+
+    def prequeued_eta(self, order_id):
+        entry = self._prequeued.get(order_id)
+        return entry[1] if entry else None
+
+    def forget_order(self, order_id):
+        with self._lock:
+            self._prequeued.pop(order_id, None)
+
+    def forget_session(self, session_id):
+        with self._lock:
+            for order_id in [o for o, (s, _) in self._prequeued.items() if s == session_id]:
+                del self._prequeued[order_id]
+
+refill_predictor = RefillPredictor()
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import timezone
+from services.coaster_state import coaster_store
+
+# Ohne Messung seit so vielen Sekunden gilt ein Sensor als ausgefallen
+STALE_AFTER = float(os.environ.get("SENSOR_STALE_AFTER", "120"))
+SWEEP_INTERVAL = float(os.environ.get("SENSOR_SWEEP_INTERVAL", "15"))
+# Messrate und größte Lücke werden pro Zeitfenster ermittelt
+RATE_WINDOW = 60
+
+logger = logging.getLogger(__name__)
+
+class SensorStats:
+    __slots__ = ("last_seen", "window_start", "window_count", "window_max_gap",
+                 "rate", "max_gap", "stale_since")
+
+    def __init__(self, now):
+        self.last_seen = None
+        self.window_start = now
+        self.window_count = 0
+        self.window_max_gap = 0
+        self.rate = None  # Messungen pro Minute im letzten vollen Fenster
+        self.max_gap = None
+        self.stale_since = None
+
+    def roll(self, now):
+        if now - self.window_start >= RATE_WINDOW:
+            elapsed = now - self.window_start
+            self.rate = round(self.window_count * 60 / elapsed, 1)
+            self.max_gap = round(self.window_max_gap, 1)
+            self.window_start = now
+            self.window_count = 0
+            self.window_max_gap = 0
+
+    def record(self, now):
+        self.roll(now)
+        if self.last_seen is not None:
+            self.window_max_gap = max(self.window_max_gap, now - self.last_seen)
+        self.last_seen = now
+        self.window_count += 1
+        self.stale_since = None
+
+def to_unix(dt):
+    return dt.replace(tzinfo=timezone.utc).timestamp() if dt else None
+
+class SensorHealth:
+    def __init__(self, stale_after=STALE_AFTER):
+        self.stale_after = stale_after
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, bierdeckel_id, now=None):
+        now = now or time.time()
+        with self._lock:
+            stats = self._stats.get(bierdeckel_id)
+            if stats is None:
+                stats = self._stats[bierdeckel_id] = SensorStats(now)
+            stats.record(now)
+
+    # Letzte Messung: eigene Messungen oder last_reading_at aus der DB (andere
+    # Worker). last_updated taugt nicht, es ist schon beim Anlegen gesetzt.
+    def last_seen(self, state):
+        stats = self._stats.get(state.id)
+        local = stats.last_seen if stats else None
+        stored = to_unix(state.last_reading_at)
+        if local is None:
+            return stored
+        return max(local, stored or 0)
+
+    # Ausgefallene Sensoren markieren, gibt neu ausgefallene zurück
+    def sweep(self, coasters, now=None):
+        now = now or time.time()
+        newly_stale = []
+        with self._lock:
+            for state in coasters:
+                stats = self._stats.get(state.id)
+                if stats is None:
+                    stats = self._stats[state.id] = SensorStats(now)
+                stats.roll(now)
+                seen = self.last_seen(state)
+                if seen is not None and now - seen > self.stale_after:
+                    if stats.stale_since is None:
+                        stats.stale_since = seen + self.stale_after
+                        newly_stale.append(state)
+                else:
+                    stats.stale_since = None
+        return newly_stale
+
+    def summary(self, coasters, now=None):
+        now = now or time.time()
+        result = []
+        with self._lock:
+            for state in coasters:
+                stats = self._stats.get(state.id)
+                seen = self.last_seen(state)
+                if seen is None:
+                    health = "never_seen"
+                elif now - seen > self.stale_after:
+                    health = "stale"
+                else:
+                    health = "ok"
+                stale_since = None
+                if health == "stale":
+                    # Vom Sweeper gesetzt; bis zu seinem nächsten Lauf aus der letzten Messung
+                    stale_since = stats.stale_since if stats and stats.stale_since else seen + self.stale_after
+                result.append({
+                    "bierdeckel_id": state.id,
+                    "label": state.label,
+                    "table_number": state.table_number,
+                    "health": health,
+                    "last_seen": seen,
+                    "seconds_since_seen": round(now - seen, 1) if seen is not None else None,
+                    "readings_per_minute": stats.rate if stats else None,
+                    "max_gap": stats.max_gap if stats else None,
+                    "stale_since": stale_since  # Unix-Zeit
+                })
+
+        order = {"stale": 0, "never_seen": 1, "ok": 2}
+        result.sort(key=lambda r: (order[r["health"]], r["table_number"] or 0, r["label"]))
+        return {
+            "stale_after": self.stale_after,
+            "total": len(result),
+            "ok": sum(1 for r in result if r["health"] == "ok"),
+            "stale": sum(1 for r in result if r["health"] == "stale"),
+            "never_seen": sum(1 for r in result if r["health"] == "never_seen"),
+            "bierdeckel": result
+        }
+
+sensor_health = SensorHealth()
+
+async def run_health_sweeper():
+    while True:
+        await asyncio.sleep(SWEEP_INTERVAL)
+        for state in sensor_health.sweep(coaster_store.all()):
+            logger.warning("Sensor ausgefallen: %s (Tisch %s, %s)", state.label, state.table_number, state.id)
+
+def start_health_sweeper():
+    return asyncio.create_task(run_health_sweeper())
@@ -0,0 +1,202 @@
+import asyncio
+import os
+import threading
+import time
+from datetime import timezone
+from sqlalchemy.orm import Session
+from models.service_call import ServiceCall
+from models.payment import Payment
+from models.session import TableSession
+from models.table import Table
+from services.events import hub
+from services.bus import bus
+from services.dashboard import dashboard_feed, restaurant_topic
+
+# Vollständiges Neuladen als Absicherung, wie bei der Bestell-Queue
+REFRESH_INTERVAL = float(os.environ.get("SERVICE_QUEUE_REFRESH", "30"))
+SWEEP_INTERVAL = float(os.environ.get("SERVICE_SWEEP_INTERVAL", "10"))
+
+# Kleinere Zahl = weiter vorne. Wer zahlen will oder die Servicekraft ruft, wartet aktiv.
+PRIORITY = {"payment": 0, "bill": 0, "waiter": 1}
+DEFAULT_PRIORITY = 2
+
+# Sekunden bis eine offene Anfrage als überfällig gilt und nach vorne rückt
+SLA = {
+    0: float(os.environ.get("SERVICE_SLA_PAYMENT", "120")),
+    1: float(os.environ.get("SERVICE_SLA_WAITER", "180")),
+    2: float(os.environ.get("SERVICE_SLA_OTHER", "300")),
+}
+
+# Überfällige zuerst, dann offene vor angenommenen, dann Priorität und Alter
+def queue_key(entry):
+    return (not entry["escalated"], entry["status"] != "open", entry["priority"], entry["created_at"])
+
+def queue_entry(request_id, restaurant_id, session_id, table_number, request_type, message, status, created_at, now=None):
+    now = now or time.time()
+    priority = PRIORITY.get(request_type, DEFAULT_PRIORITY)
+    due_at = created_at.replace(tzinfo=timezone.utc).timestamp() + SLA[priority]
+    return {
+        "request_id": request_id,
+        "restaurant_id": restaurant_id,
+        "session_id": session_id,
+        "table_number": table_number,
+        "request_type": request_type,
+        "message": message,
+        "status": status,
+        "priority": priority,
+        "due_at": due_at,  # Unix-Zeit
+        "escalated": status == "open" and now >= due_at,
+        "created_at": str(created_at)
+    }
+
+def service_entry(call, restaurant_id, table_number, now=None):
+    return queue_entry(
+        call.id, restaurant_id, call.session_id, table_number,
+        call.request_type, call.message, call.status, call.created_at, now
+    )
+
+# Zahlungswünsche stehen als Anfrage "payment" in der Queue, bis die Zahlung
+# bestätigt ist (/payment/{id}/confirm, nicht über den Anfrage-Status)
+def payment_entry(payment, restaurant_id, table_number, now=None):
+    entry = queue_entry(
+        payment.id, restaurant_id, payment.session_id, table_number, "payment",
+        f"{payment.amount:.2f} €", "open" if payment.status == "requested" else "done", payment.created_at, now
+    )
+    entry["payment_id"] = payment.id
+    return entry
+
+# Serviceanfragen mit Tischnummer in einer Abfrage laden
+def load_calls(db: Session, *criteria):
+    rows = db.query(ServiceCall, Table.table_number).join(
+        TableSession, TableSession.id == ServiceCall.session_id
+    ).outerjoin(
+        Table, Table.id == TableSession.table_id
+    ).filter(*criteria).all()
+
+    now = time.time()
+    return [service_entry(call, call.restaurant_id, table_number, now) for call, table_number in rows]
+
+# Zahlungswünsche ebenso
+def load_payments(db: Session, *criteria):
+    rows = db.query(Payment, TableSession.restaurant_id, Table.table_number).join(
+        TableSession, TableSession.id == Payment.session_id
+    ).outerjoin(
+        Table, Table.id == TableSession.table_id
+    ).filter(*criteria).all()
+
+    now = time.time()
+    return [payment_entry(payment, restaurant_id, table_number, now) for payment, restaurant_id, table_number in rows]
+
+# Offene Serviceanfragen pro Restaurant, sortiert nach Dringlichkeit. Die
+# sortierte Liste wird nur nach Änderungen neu gebaut.
+class ServiceQueue:
+    def __init__(self):
+        self._queues = {}
+        self._sorted = {}
+        self._loaded_at = {}
+        self._lock = threading.Lock()
+
+    def _reload(self, db: Session, restaurant_id):
+        entries = load_calls(db, ServiceCall.restaurant_id == restaurant_id, ServiceCall.status != "done")
+        entries += load_payments(
+            db, TableSession.restaurant_id == restaurant_id, TableSession.is_active == True, Payment.status == "requested"
+        )
+        with self._lock:
+            self._queues[restaurant_id] = {e["request_id"]: e for e in entries}
+            self._sorted.pop(restaurant_id, None)
+            self._loaded_at[restaurant_id] = time.monotonic()
+
+    def entries(self, db: Session, restaurant_id):
+        loaded_at = self._loaded_at.get(restaurant_id)
+        if loaded_at is None or time.monotonic() - loaded_at > REFRESH_INTERVAL:
+            self._reload(db, restaurant_id)
+        return self._cached(restaurant_id)
+
+    def _cached(self, restaurant_id):
+        with self._lock:
+            result = self._sorted.get(restaurant_id)
+            if result is None:
+                result = self._sorted[restaurant_id] = sorted(self._queues[restaurant_id].values(), key=queue_key)
+            return result
+
+    # Neue oder geänderte Anfragen übernehmen (erst nach dem Commit aufrufen),
+    # geht über den Bus an alle Worker
+    def push(self, entries):
+        if entries:
+            bus.publish("service_calls", entries)
+
+    # In jedem Worker: eigene Liste aktualisieren und an die Dashboards senden
+    def apply(self, seq, entries):
+        changed = set()
+        for entry in entries:
+            restaurant_id = entry["restaurant_id"]
+            with self._lock:
+                queue = self._queues.get(restaurant_id)
+                if queue is None:
+                    continue
+                if entry["status"] == "done":
+                    queue.pop(entry["request_id"], None)
+                else:
+                    queue[entry["request_id"]] = entry
+                self._sorted.pop(restaurant_id, None)
+            changed.add(restaurant_id)
+        self._publish(seq, changed, [entry["session_id"] for entry in entries])
+
+    def _publish(self, seq, restaurant_ids, session_ids):
+        for restaurant_id in restaurant_ids:
+            topic = restaurant_topic(restaurant_id)
+            if hub.has_subscribers(topic):
+                hub.publish(topic, "service_requests", self._cached(restaurant_id))
+        # Tische (Anzahl offener Anfragen) und ETag
+        dashboard_feed.mark(seq, session_ids)
+
+    # Offene Anfragen über der Frist, noch nicht eskaliert
+    def overdue(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            return [
+                {"restaurant_id": entry["restaurant_id"], "request_id": entry["request_id"], "session_id": entry["session_id"]}
+                for queue in self._queues.values()
+                for entry in queue.values()
+                if entry["status"] == "open" and not entry["escalated"] and now >= entry["due_at"]
+            ]
+
+    def escalate(self, overdue):
+        if overdue:
+            bus.publish("service_escalations", overdue)
+
+    # Nur Anfragen markieren, die hier noch offen sind: eine Eskalation aus einem
+    # anderen Worker darf eine inzwischen erledigte Anfrage nicht zurückholen
+    def on_escalate(self, seq, overdue):
+        changed = set()
+        with self._lock:
+            for item in overdue:
+                queue = self._queues.get(item["restaurant_id"])
+                entry = queue.get(item["request_id"]) if queue is not None else None
+                if entry is None or entry["status"] != "open" or entry["escalated"]:
+                    continue
+                queue[item["request_id"]] = dict(entry, escalated=True)
+                self._sorted.pop(item["restaurant_id"], None)
+                changed.add(item["restaurant_id"])
+        if changed:
+            self._publish(seq, changed, [item["session_id"] for item in overdue])
+
+service_queue = ServiceQueue()
+bus.subscribe("service_calls", service_queue.apply)
+bus.subscribe("service_escalations", service_queue.on_escalate)
+
+# Jeder Worker prüft seine Listen; die Eskalation geht über den Bus, damit alle
+# Worker (und ETags) denselben Stand haben. Meldet ein zweiter Worker dieselbe
+# Anfrage, ist sie beim Empfang schon eskaliert und wird übersprungen.
+async def run_service_sweeper():
+    while True:
+        await asyncio.sleep(SWEEP_INTERVAL)
+        overdue = service_queue.overdue()
+        if overdue:
+            try:
+                await asyncio.to_thread(service_queue.escalate, overdue)
+            except Exception as e:
+                print(f"Service-Eskalation fehlgeschlagen: {e}")
+
+def start_service_sweeper():
+    return asyncio.create_task(run_service_sweeper())
@@ -0,0 +1,57 @@
+from sqlalchemy.orm import Session
+from database.db import SessionLocal
+from models.session import TableSession
+from models.table import Table
+from models.game import GamePlayer
+from services.events import publish_event
+
+def session_topic(session_id):
+    return f"session/{session_id}"
+
+def session_info(db: Session, session_id):
+    row = db.query(TableSession, Table.table_number).outerjoin(
+        Table, Table.id == TableSession.table_id
+    ).filter(TableSession.id == session_id).first()
+    if not row:
+        return None
+    session, table_number = row
+    return {
+        "session_id": session.id,
+        "bierdeckel_id": session.bierdeckel_id,
+        "table_number": table_number,
+        "restaurant_id": session.restaurant_id,
+        "is_active": session.is_active,
+        "group_id": session.group_id,
+        "created_at": str(session.created_at)
+    }
+
+def notify_sessions(session_ids, event, data):
+    publish_event([session_topic(session_id) for session_id in session_ids], event, data)
+
+# Aktuellen Stand der Sessions senden (Schließen, Gruppenwechsel)
+def notify_session_info(db: Session, session_ids):
+    for session_id in session_ids:
+        info = session_info(db, session_id)
+        if info:
+            publish_event(session_topic(session_id), "session", info)
+
+# Alle aktiven Mitglieder einer Gruppe laden die Gruppe neu
+def notify_group(db: Session, group_id):
+    members = db.query(TableSession.id).filter(
+        TableSession.group_id == group_id,
+        TableSession.is_active == True
+    ).all()
+    notify_sessions([session_id for (session_id,) in members], "group", {"group_id": group_id})
+
+# Alle Spieler (auch angefragte) und der Ersteller laden das Spiel neu
+def notify_game(db: Session, game, action):
+    players = db.query(GamePlayer.session_id).filter(GamePlayer.game_id == game.id).all()
+    session_ids = {session_id for (session_id,) in players} | {game.session_id}
+    notify_sessions(session_ids, "game", {"game_id": game.id, "action": action, "status": game.status})
+
+def session_snapshot(session_id):
+    db = SessionLocal()
+    try:
+        return [("session", session_info(db, session_id))]
+    finally:
+        db.close()
@@ -0,0 +1,26 @@
+from sqlalchemy.orm import Session
+from database.db import SessionLocal
+from models.restaurant import Restaurant
+from services.coaster_state import coaster_store
+from services.order_queue import order_queue
+from services.service_queue import service_queue
+from services.dashboard import dashboard_tables, payment_requests, coaster_entry
+
+# Alles, was das Dashboard anzeigt, in einem Stück (Anfangsstand des Streams)
+def restaurant_snapshot(db: Session, restaurant_id):
+    restaurant = db.query(Restaurant).filter(Restaurant.id == restaurant_id).first()
+    return {
+        "restaurant": restaurant.name if restaurant else None,
+        "tables": dashboard_tables(db, restaurant_id),
+        "orders": order_queue.entries(db, restaurant_id),
+        "service_requests": service_queue.entries(db, restaurant_id),
+        "payment_requests": payment_requests(db, restaurant_id),
+        "bierdeckel": [coaster_entry(state) for state in coaster_store.for_restaurant(db, restaurant_id)]
+    }
+
+def snapshot_events(restaurant_id):
+    db = SessionLocal()
+    try:
+        return [("snapshot", restaurant_snapshot(db, restaurant_id))]
+    finally:
+        db.close()
@@ -0,0 +1,61 @@
+from fastapi import HTTPException
+
+SPLIT_MODES = ("even", "per_item", "custom")
+
+def invalid(detail):
+    return HTTPException(status_code=400, detail=detail)
+
+# Betrag in Cent nach Gewichten verteilen (größter Rest), Summe bleibt exakt
+def allocate(total_cents, weights):
+    weight_sum = sum(weights.values())
+    if weight_sum <= 0:
+        raise invalid("Keine Anteile zum Aufteilen")
+
+    exact = {key: total_cents * w / weight_sum for key, w in weights.items()}
+    cents = {key: int(value) for key, value in exact.items()}
+    leftover = total_cents - sum(cents.values())
+    for key in sorted(exact, key=lambda k: exact[k] - cents[k], reverse=True)[:leftover]:
+        cents[key] += 1
+    return cents
+
+# Gewichte pro Session. members: Session-IDs der Gruppe, items: (order_item_id,
+# session_id, subtotal) in einem Durchlauf über alle Artikel der Gruppe.
+def split_weights(mode, members, items=(), shares=None, assignments=None):
+    if mode not in SPLIT_MODES:
+        raise invalid("Ungültige Aufteilung")
+    member_set = set(members)
+
+    if mode == "even":
+        return {session_id: 1 for session_id in members}
+
+    if mode == "custom":
+        if not shares:
+            raise invalid("Anteile fehlen")
+        for session_id, weight in shares.items():
+            if session_id not in member_set:
+                raise invalid(f"Session {session_id} ist nicht in der Gruppe")
+            if weight < 0:
+                raise invalid("Anteile dürfen nicht negativ sein")
+        return {session_id: shares.get(session_id, 0) for session_id in members}
+
+    # per_item: jeder zahlt seine Artikel, geteilte Artikel zu gleichen Teilen
+    assignments = assignments or {}
+    for item_id, targets in assignments.items():
+        if not targets:
+            raise invalid(f"Artikel {item_id} ist niemandem zugeordnet")
+        for session_id in targets:
+            if session_id not in member_set:
+                raise invalid(f"Session {session_id} ist nicht in der Gruppe")
+
+    weights = {session_id: 0 for session_id in members}
+    seen = set()
+    for item_id, owner, subtotal in items:
+        seen.add(item_id)
+        targets = assignments.get(item_id) or [owner]
+        for session_id in targets:
+            weights[session_id] += subtotal / len(targets)
+
+    unknown = set(assignments) - seen
+    if unknown:
+        raise invalid(f"Artikel {next(iter(unknown))} gehört nicht zur Gruppe")
+    return weights
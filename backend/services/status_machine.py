@@ -0,0 +1,63 @@
+import os
+
+# Schwellen in Gramm
+NO_GLASS_BELOW = 100
+EMPTY_BELOW = 300
+
+# Band um jede Schwelle, das überschritten werden muss, um den Status zu verlassen
+HYSTERESIS = float(os.environ.get("COASTER_HYSTERESIS", "15"))
+# So lange muss ein neuer Status stabil anliegen, bevor er übernommen wird
+MIN_DWELL = float(os.environ.get("COASTER_MIN_DWELL", "2"))
+
+STATUS_ORDER = ["no_glass", "empty", "full"]
+
+def weight_to_status(weight: float) -> str:
+    if weight < NO_GLASS_BELOW:
+        return "no_glass"
+    elif weight < EMPTY_BELOW:
+        return "empty"
+#   elif weight < 320:
+#      return "half"
+    else:
+        return "full"
+
+# Schwelle in Richtung des Wechsels um das Hysterese-Band verschieben
+def status_with_hysteresis(weight: float, current: str, band: float = HYSTERESIS) -> str:
+    raw = weight_to_status(weight)
+    if raw == current or current not in STATUS_ORDER:
+        return raw
+    if STATUS_ORDER.index(raw) > STATUS_ORDER.index(current):
+        return weight_to_status(weight - band)
+    return weight_to_status(weight + band)
+
+class StatusDebouncer:
+    __slots__ = ("stable", "candidate", "candidate_since", "band", "dwell")
+
+    def __init__(self, stable: str, band: float = HYSTERESIS, dwell: float = MIN_DWELL):
+        self.stable = stable
+        self.candidate = None
+        self.candidate_since = None
+        self.band = band
+        self.dwell = dwell
+
+    # Messung einspeisen, gibt den stabilen Status zurück. now: Empfangszeit
+    # (time.monotonic), nicht der Zeitstempel des Sensors – Wartezeit und
+    # promote() laufen so auf derselben Uhr
+    def update(self, weight: float, now: float) -> str:
+        target = status_with_hysteresis(weight, self.stable, self.band)
+        if target == self.stable:
+            self.candidate = None
+            return self.stable
+
+        if target != self.candidate:
+            self.candidate = target
+            self.candidate_since = now
+        return self.promote(now)
+
+    # Kandidat übernehmen, wenn er lange genug anliegt – auch ohne neue Messung
+    # (Sensoren, die nur bei Änderung senden, oder eine einzelne Messung)
+    def promote(self, now: float) -> str:
+        if self.candidate is not None and now - self.candidate_since >= self.dwell:
+            self.stable = self.candidate
+            self.candidate = None
+        return self.stable
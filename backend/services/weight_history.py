@@ -0,0 +1,173 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, select, func, cast, event
+
+# Eigene Datei, damit die Haupt-DB nicht mit Messwerten wächst
+HISTORY_DATABASE_URL = os.environ.get("WEIGHT_HISTORY_URL", "sqlite:///weight_history.db")
+FLUSH_INTERVAL = float(os.environ.get("WEIGHT_HISTORY_FLUSH_INTERVAL", "10"))
+RETENTION_DAYS = float(os.environ.get("WEIGHT_HISTORY_RETENTION_DAYS", "30"))
+# Ungeschriebene Messungen pro Bierdeckel (älteste fallen bei Überlauf raus)
+BUFFER_SIZE = 2048
+MAX_BUCKETS = 2000
+# Kleinstes Zeitfenster in Sekunden (Zeitstempel sind Millisekunden)
+MIN_BUCKET = 1
+
+history_engine = create_engine(HISTORY_DATABASE_URL, connect_args={"check_same_thread": False})
+
+@event.listens_for(history_engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+metadata = MetaData()
+
+# Bierdeckel-ID (UUID) nur einmal speichern, Messungen referenzieren die Zahl
+coasters = Table(
+    "coasters", metadata,
+    Column("key", Integer, primary_key=True),
+    Column("bierdeckel_id", String, unique=True, nullable=False)
+)
+
+# Zeit in Millisekunden, Gewicht in 0,1 g – als SQLite-Integer nur wenige Bytes
+weight_samples = Table(
+    "weight_samples", metadata,
+    Column("coaster_key", Integer, primary_key=True),
+    Column("ts_ms", Integer, primary_key=True),
+    Column("weight_dg", Integer, nullable=False),
+    sqlite_with_rowid=False
+)
+
+class WeightHistory:
+    def __init__(self, engine):
+        self.engine = engine
+        self._pending = {}
+        self._keys = {}
+        self._lock = threading.Lock()
+        self._last_prune = 0
+        metadata.create_all(bind=engine)
+
+    def record(self, bierdeckel_id, ts, weight):
+        with self._lock:
+            buffer = self._pending.get(bierdeckel_id)
+            if buffer is None:
+                buffer = self._pending[bierdeckel_id] = deque(maxlen=BUFFER_SIZE)
+            buffer.append((int(ts * 1000), int(round(weight * 10))))
+
+    def _coaster_keys(self, conn, ids, create=False):
+        missing = [i for i in ids if i not in self._keys]
+        if missing and create:
+            conn.execute(coasters.insert().prefix_with("OR IGNORE"), [{"bierdeckel_id": i} for i in missing])
+        if missing:
+            rows = conn.execute(select(coasters.c.bierdeckel_id, coasters.c.key).where(
+                coasters.c.bierdeckel_id.in_(missing)
+            ))
+            self._keys.update({bid: key for bid, key in rows})
+        return {i: self._keys[i] for i in ids if i in self._keys}
+
+    # Gepufferte Messungen in einer Transaktion schreiben
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            with self.engine.begin() as conn:
+                keys = self._coaster_keys(conn, list(pending), create=True)
+                rows = [
+                    {"coaster_key": keys[bid], "ts_ms": ts_ms, "weight_dg": weight_dg}
+                    for bid, buffer in pending.items()
+                    for ts_ms, weight_dg in buffer
+                ]
+                conn.execute(weight_samples.insert().prefix_with("OR IGNORE"), rows)
+
+                now = time.time()
+                if now - self._last_prune > 3600:
+                    cutoff = int((now - RETENTION_DAYS * 86400) * 1000)
+                    conn.execute(weight_samples.delete().where(weight_samples.c.ts_ms < cutoff))
+                    self._last_prune = now
+        except Exception:
+            # Beim nächsten Flush erneut versuchen
+            with self._lock:
+                for bid, buffer in pending.items():
+                    newer = self._pending.get(bid, ())
+                    merged = deque(buffer, maxlen=BUFFER_SIZE)
+                    merged.extend(newer)
+                    self._pending[bid] = merged
+            raise
+        return len(rows)
+
+    # Min/Max/Durchschnitt pro Zeitfenster (start/end in Unix-Sekunden)
+    def buckets(self, bierdeckel_id, start, end, bucket):
+        bucket_ms = max(int(bucket * 1000), 1)
+        start_ms, end_ms = int(start * 1000), int(end * 1000)
+        stats = {}
+
+        def add(b, low, high, total, count):
+            entry = stats.get(b)
+            if entry is None:
+                stats[b] = [low, high, total, count]
+            else:
+                entry[0] = min(entry[0], low)
+                entry[1] = max(entry[1], high)
+                entry[2] += total
+                entry[3] += count
+
+        with self.engine.connect() as conn:
+            key = self._coaster_keys(conn, [bierdeckel_id]).get(bierdeckel_id)
+            if key is not None:
+                b = cast((weight_samples.c.ts_ms - start_ms) / bucket_ms, Integer)
+                rows = conn.execute(
+                    select(
+                        b.label("b"),
+                        func.min(weight_samples.c.weight_dg),
+                        func.max(weight_samples.c.weight_dg),
+                        func.sum(weight_samples.c.weight_dg),
+                        func.count()
+                    ).where(
+                        weight_samples.c.coaster_key == key,
+                        weight_samples.c.ts_ms >= start_ms,
+                        weight_samples.c.ts_ms < end_ms
+                    ).group_by("b")
+                )
+                for row in rows:
+                    add(*row)
+
+        # Noch nicht geschriebene Messungen dazunehmen
+        with self._lock:
+            pending = list(self._pending.get(bierdeckel_id, ()))
+        for ts_ms, weight_dg in pending:
+            if start_ms <= ts_ms < end_ms:
+                add((ts_ms - start_ms) // bucket_ms, weight_dg, weight_dg, weight_dg, 1)
+
+        return [
+            {
+                "start": (start_ms + b * bucket_ms) / 1000,
+                "min": low / 10,
+                "max": high / 10,
+                "avg": round(total / count / 10, 1),
+                "count": count
+            }
+            for b, (low, high, total, count) in sorted(stats.items())
+        ]
+
+weight_history = WeightHistory(history_engine)
+
+async def run_history_flusher():
+    try:
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await asyncio.to_thread(weight_history.flush)
+            except Exception as e:
+                print(f"Gewichtsverlauf-Flush fehlgeschlagen: {e}")
+    finally:
+        weight_history.flush()
+
+def start_history_flusher():
+    return asyncio.create_task(run_history_flusher())
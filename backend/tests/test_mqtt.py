@@ -0,0 +1,148 @@
+# MQTT-Subscriber gegen einen Broker-Ersatz (asyncio-Server) prüfen.
+# Aus backend/: python -m unittest tests.test_mqtt
+import asyncio
+import json
+import struct
+import unittest
+from services.mqtt import (
+    MqttSubscriber, packet, encode_string, read_packet,
+    CONNECT, CONNACK, PUBLISH, PUBACK, SUBSCRIBE, SUBACK, PINGREQ, PINGRESP
+)
+
+def publish_packet(topic, payload, packet_id=None):
+    body = encode_string(topic)
+    header = PUBLISH
+    if packet_id is not None:
+        header |= 0x02  # QoS 1
+        body += struct.pack("!H", packet_id)
+    return packet(header, body + payload)
+
+class FakeBroker:
+    def __init__(self, answer_pings=True):
+        self.answer_pings = answer_pings
+        self.connections = 0
+        self.subscribed = asyncio.Event()
+        self.pubacks = asyncio.Queue()
+        self.clients = []
+        self.handlers = []
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for writer in self.clients:
+            writer.close()
+        await asyncio.gather(*self.handlers)
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        self.clients.append(writer)
+        self.handlers.append(asyncio.current_task())
+        try:
+            while True:
+                header, body = await read_packet(reader)
+                kind = header & 0xF0
+                if kind == CONNECT:
+                    writer.write(packet(CONNACK, bytes([0, 0])))
+                elif header == SUBSCRIBE:
+                    writer.write(packet(SUBACK, body[:2] + bytes([1])))
+                    self.subscribed.set()
+                elif kind == PUBACK:
+                    await self.pubacks.put(struct.unpack("!H", body)[0])
+                elif kind == PINGREQ and self.answer_pings:
+                    writer.write(packet(PINGRESP))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    # Verbindung des zuletzt verbundenen Clients trennen
+    def drop(self):
+        self.clients[-1].close()
+        self.subscribed.clear()
+
+    def send(self, data):
+        self.clients[-1].write(data)
+
+class MqttSubscriberTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.readings = []
+        self.broker = FakeBroker()
+        await self.broker.start()
+
+    async def asyncTearDown(self):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        await self.broker.stop()
+
+    async def handler(self, readings):
+        self.readings.extend(readings)
+
+    def start_subscriber(self, keepalive=30):
+        self.subscriber = MqttSubscriber("127.0.0.1", self.broker.port, handler=self.handler, keepalive=keepalive)
+        self.task = asyncio.create_task(self.subscriber.run())
+
+    async def test_parses_and_acks_after_ingest(self):
+        self.start_subscriber()
+        await asyncio.wait_for(self.broker.subscribed.wait(), 5)
+
+        self.broker.send(publish_packet("bierdeckel/bd-001/weight", b"412.5", packet_id=7))
+        self.broker.send(publish_packet("bierdeckel/x/weight", json.dumps({
+            "bierdeckel_id": "bd-002", "weight": 150, "timestamp": 1700000000
+        }).encode(), packet_id=8))
+
+        acked = [await asyncio.wait_for(self.broker.pubacks.get(), 5) for _ in range(2)]
+        self.assertEqual(sorted(acked), [7, 8])
+        # Bestätigt wird erst nach der Verarbeitung
+        self.assertEqual(self.readings, [("bd-001", 412.5, None), ("bd-002", 150.0, 1700000000.0)])
+
+    async def test_malformed_packets_keep_connection(self):
+        self.start_subscriber()
+        await asyncio.wait_for(self.broker.subscribed.wait(), 5)
+
+        self.broker.send(packet(PUBLISH, b"\x00"))  # Topic-Länge abgeschnitten
+        self.broker.send(packet(PUBLISH, encode_string("x")[:2] + b"\xff"))  # Topic kein UTF-8
+        self.broker.send(publish_packet("bierdeckel/bd-001/weight", b"kaputt", packet_id=3))
+        self.broker.send(publish_packet("bierdeckel/bd-001/weight", b"300", packet_id=4))
+
+        acked = [await asyncio.wait_for(self.broker.pubacks.get(), 5) for _ in range(2)]
+        self.assertEqual(sorted(acked), [3, 4])
+        self.assertEqual(self.readings, [("bd-001", 300.0, None)])
+        self.assertEqual(self.broker.connections, 1)
+
+    async def test_ingest_error_still_acks(self):
+        async def failing(readings):
+            raise RuntimeError("DB weg")
+        self.start_subscriber()
+        self.subscriber.handler = failing
+        await asyncio.wait_for(self.broker.subscribed.wait(), 5)
+
+        self.broker.send(publish_packet("bierdeckel/bd-001/weight", b"300", packet_id=5))
+        self.assertEqual(await asyncio.wait_for(self.broker.pubacks.get(), 5), 5)
+        self.assertEqual(self.broker.connections, 1)
+
+    async def test_reconnects_after_drop(self):
+        self.start_subscriber()
+        await asyncio.wait_for(self.broker.subscribed.wait(), 5)
+        self.broker.drop()
+
+        await asyncio.wait_for(self.broker.subscribed.wait(), 5)
+        self.assertEqual(self.broker.connections, 2)
+        self.broker.send(publish_packet("bierdeckel/bd-003/weight", b"500", packet_id=1))
+        self.assertEqual(await asyncio.wait_for(self.broker.pubacks.get(), 5), 1)
+        self.assertEqual(self.readings, [("bd-003", 500.0, None)])
+
+    async def test_reconnects_without_pingresp(self):
+        self.broker.answer_pings = False
+        self.start_subscriber(keepalive=1)
+        await asyncio.wait_for(self.broker.subscribed.wait(), 5)
+        self.broker.subscribed.clear()
+
+        # PINGREQ nach 0,5 s, Frist 0,5 s, dann 1 s Pause vor dem neuen Versuch
+        await asyncio.wait_for(self.broker.subscribed.wait(), 5)
+        self.assertEqual(self.broker.connections, 2)
+
+if __name__ == "__main__":
+    unittest.main()
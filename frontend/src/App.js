@@ -16,6 +16,7 @@ import Dashboard from './dashboard/pages/Dashboard';
 import MenuManager from './dashboard/pages/MenuManager';
 import TableManager from './dashboard/pages/TableManager';
 import StaffManager from './dashboard/pages/StaffManager';
+import BarDisplay from './dashboard/pages/BarDisplay';
 
 function App() {
     return (
@@ -39,6 +40,7 @@ function App() {
                 <Route path="/dashboard/menu" element={<MenuManager />} />
                 <Route path="/dashboard/tables" element={<TableManager />} />
                 <Route path="/dashboard/staff" element={<StaffManager />} />
+                <Route path="/dashboard/bar" element={<BarDisplay />} />
             </Routes>
         </BrowserRouter>
     );
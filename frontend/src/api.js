@@ -6,4 +6,28 @@ const API = axios.create({
         : 'https://bierdeckel.onrender.com'
 });
 
-export default API;
\ No newline at end of file
+export default API;
+
+// POST mit Idempotency-Key: Der Schlüssel bleibt gespeichert, bis der Server
+// geantwortet hat. Ein erneuter Versuch nach einem Netzwerkfehler (oder Reload)
+// schickt denselben Schlüssel und erzeugt keine doppelte Bestellung/Zahlung.
+export const postOnce = async (action, url, data) => {
+    const storageKey = `idempotency_${action}`;
+    let key = localStorage.getItem(storageKey);
+    if (!key) {
+        key = window.crypto && window.crypto.randomUUID
+            ? window.crypto.randomUUID()
+            : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+        localStorage.setItem(storageKey, key);
+    }
+    try {
+        const res = await API.post(url, data, { headers: { 'Idempotency-Key': key } });
+        localStorage.removeItem(storageKey);
+        return res;
+    } catch (err) {
+        if (err.response) {
+            localStorage.removeItem(storageKey);
+        }
+        throw err;
+    }
+};
@@ -1,25 +1,36 @@
 import React, { useEffect } from 'react';
 import { useNavigate, useLocation } from 'react-router-dom';
 import API from '../../api';
+import { subscribeSession } from '../../sessionEvents';
 
 function Navbar() {
     const navigate = useNavigate();
     const location = useLocation();
 
     useEffect(() => {
+        // Schließen der Session kommt über den Stream, ohne EventSource alle 5 Sekunden abfragen
+        const unsubscribe = subscribeSession(localStorage.getItem('session_id'), {
+            session: (info) => { if (!info.is_active) sessionEnded(); },
+            closed: checkSession
+        });
+        if (unsubscribe) return unsubscribe;
         const interval = setInterval(checkSession, 5000);
         return () => clearInterval(interval);
     }, []);
 
+    const sessionEnded = () => {
+        alert('Deine Session wurde vom Service beendet. Tschüss!');
+        localStorage.clear();
+        navigate('/');
+    };
+
     const checkSession = async () => {
         const sessionId = localStorage.getItem('session_id');
         if (!sessionId) return;
         try {
             const res = await API.get(`/session/${sessionId}`);
             if (!res.data.is_active) {
-                alert('Deine Session wurde vom Service beendet. Tschüss!');
-                localStorage.clear();
-                navigate('/');
+                sessionEnded();
             }
         } catch (err) {
             localStorage.clear();
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
-import API from '../../api';
+import API, { postOnce } from '../../api';
 
 function Cart() {
     const [cart, setCart] = useState([]);
@@ -32,7 +32,7 @@ function Cart() {
                 menu_item_id: item.menu_item_id,
                 quantity: item.quantity
             }));
-            await API.post(`/session/${sessionId}/order`, { items });
+            await postOnce(`order_${sessionId}`, `/session/${sessionId}/order`, { items });
             localStorage.setItem('cart', '[]');
             setCart([]);
             setOrderSent(true);
@@ -1,5 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import API from '../../api';
+import { subscribeSession } from '../../sessionEvents';
 
 function DrinkTogether() {
     const [readyList, setReadyList] = useState([]);
@@ -11,24 +12,51 @@ function DrinkTogether() {
 
     useEffect(() => {
         loadData();
+        // Einladungen und Gruppe kommen über den Stream, die Bereit-Liste des
+        // ganzen Restaurants wird weiter (seltener) abgefragt
+        const unsubscribe = subscribeSession(sessionId, {
+            open: loadPersonal,
+            invitation: (inv) => setInvitations(prev => [...prev.filter(i => i.invitation_id !== inv.invitation_id), inv]),
+            session: (info) => loadGroup(info.group_id),
+            group: (data) => loadGroup(data.group_id)
+        });
+        if (unsubscribe) {
+            const interval = setInterval(loadReadyList, 15000);
+            return () => { unsubscribe(); clearInterval(interval); };
+        }
         const interval = setInterval(loadData, 5000);
         return () => clearInterval(interval);
     }, []);
 
     const loadData = async () => {
+        await loadReadyList();
+        await loadPersonal();
+    };
+
+    const loadReadyList = async () => {
         const readyRes = await API.get(`/restaurant/${restaurantId}/drink-ready`);
         setReadyList(readyRes.data);
+    };
 
+    const loadPersonal = async () => {
         const invRes = await API.get(`/session/${sessionId}/invitations`);
         setInvitations(invRes.data);
 
         // Prüfen ob in Gruppe
         try {
             const sessionRes = await API.get(`/session/${sessionId}`);
-            if (sessionRes.data.group_id) {
-                const groupRes = await API.get(`/group/${sessionRes.data.group_id}`);
-                setGroup(groupRes.data);
-            }
+            await loadGroup(sessionRes.data.group_id);
+        } catch (err) {}
+    };
+
+    const loadGroup = async (groupId) => {
+        if (!groupId) {
+            setGroup(null);
+            return;
+        }
+        try {
+            const groupRes = await API.get(`/group/${groupId}`);
+            setGroup(groupRes.data);
         } catch (err) {}
     };
 
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import API from '../../api';
+import { subscribeSession } from '../../sessionEvents';
 
 function Game() {
     const [openGames, setOpenGames] = useState([]);
@@ -19,10 +20,17 @@ function Game() {
 
     useEffect(() => {
         if (myGame) {
-            const interval = setInterval(() => {
+            const reload = () => {
                 loadGameStatus(myGame);
                 loadJoinRequests(myGame);
-            }, 3000);
+            };
+            // Anfragen, Genehmigungen, Start und Ende kommen als "game"
+            const unsubscribe = subscribeSession(sessionId, {
+                open: reload,
+                game: (event) => { if (event.game_id === myGame) reload(); }
+            });
+            if (unsubscribe) return unsubscribe;
+            const interval = setInterval(reload, 3000);
             return () => clearInterval(interval);
         }
     }, [myGame]);
@@ -1,5 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import API from '../../api';
+import { subscribeSession } from '../../sessionEvents';
 
 function OrderHistory() {
     const [orders, setOrders] = useState([]);
@@ -13,6 +14,9 @@ function OrderHistory() {
         loadOrders();
         loadAutoOrder();
         loadMenu();
+        // Statusänderungen, Auto-Bestellungen und Spielabrechnungen kommen als "order"
+        const unsubscribe = subscribeSession(sessionId, { open: loadOrders, order: loadOrders });
+        if (unsubscribe) return unsubscribe;
         const interval = setInterval(loadOrders, 5000);
         return () => clearInterval(interval);
     }, []);
@@ -62,6 +66,7 @@ function OrderHistory() {
     const sourceLabel = {
         manual: null,
         auto_order: '🔄 Auto-Bestellung',
+        auto_prequeue: '🔄 Auto-Bestellung (vorab)',
         game_loser: '🎮 Spiel (du zahlst)',
         game_winner: '🎮 Spiel (gratis!)'
     };
@@ -1,12 +1,15 @@
 import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import API from '../../api';
+import API, { postOnce } from '../../api';
 
 function Payment() {
     const [bill, setBill] = useState(null);
     const [groupBill, setGroupBill] = useState(null);
     const [paid, setPaid] = useState(false);
     const [showGroup, setShowGroup] = useState(false);
+    const [splitMode, setSplitMode] = useState(null);
+    const [splitShares, setSplitShares] = useState({});
+    const [splitPreview, setSplitPreview] = useState(null);
     const sessionId = localStorage.getItem('session_id');
     const navigate = useNavigate();
 
@@ -32,26 +35,89 @@ function Payment() {
     };
 
     const requestPayment = async () => {
-        await API.post(`/session/${sessionId}/payment-request`);
+        await postOnce(`payment_request_${sessionId}`, `/session/${sessionId}/payment-request`);
         alert('Zahlungswunsch an Kellner gesendet!');
     };
 
     const payNow = async () => {
-        await API.post(`/session/${sessionId}/pay`);
-        setPaid(true);
+        try {
+            await postOnce(`pay_${sessionId}`, `/session/${sessionId}/pay`);
+            setPaid(true);
+        } catch (err) {
+            // 409: gleichzeitig zahlt jemand anderes aus der Gruppe
+            alert(err.response?.data?.detail || 'Fehler beim Bezahlen');
+        }
         loadBill();
     };
 
     const payForGroup = async () => {
         if (window.confirm('Für alle in der Gruppe bezahlen?')) {
-            const res = await API.post(`/session/${sessionId}/pay-group`);
-            alert(res.data.message);
-            setPaid(true);
+            try {
+                const res = await API.post(`/session/${sessionId}/pay-group`);
+                alert(res.data.message);
+                setPaid(true);
+            } catch (err) {
+                alert(err.response?.data?.detail || 'Fehler beim Bezahlen');
+            }
             loadBill();
             loadGroupBill();
         }
     };
 
+    // Aufteilung nur berechnen lassen (preview), bezahlt wird erst mit splitGroup
+    const previewSplit = async (mode, shares) => {
+        setSplitMode(mode);
+        try {
+            const body = { mode, preview: true };
+            if (mode === 'custom') {
+                body.shares = shares;
+            }
+            const res = await API.post(`/session/${sessionId}/split-group`, body);
+            setSplitPreview(res.data);
+        } catch (err) {
+            setSplitPreview(null);
+            alert(err.response?.data?.detail || 'Fehler beim Aufteilen');
+        }
+    };
+
+    // Eigene Anteile: mit einem Anteil pro Mitglied beginnen
+    const startCustomSplit = async () => {
+        let shares = splitShares;
+        if (Object.keys(shares).length === 0) {
+            try {
+                const res = await API.post(`/session/${sessionId}/split-group`, { mode: 'even', preview: true });
+                shares = Object.fromEntries(res.data.shares.map(s => [s.session_id, 1]));
+                setSplitShares(shares);
+            } catch (err) {
+                alert(err.response?.data?.detail || 'Fehler beim Aufteilen');
+                return;
+            }
+        }
+        previewSplit('custom', shares);
+    };
+
+    const changeShare = (shareSessionId, value) => {
+        const shares = { ...splitShares, [shareSessionId]: Number(value) || 0 };
+        setSplitShares(shares);
+        previewSplit('custom', shares);
+    };
+
+    const splitGroup = async () => {
+        try {
+            const body = { mode: splitMode };
+            if (splitMode === 'custom') {
+                body.shares = splitShares;
+            }
+            const res = await API.post(`/session/${sessionId}/split-group`, body);
+            alert(`Rechnung aufgeteilt! Gesamt: ${res.data.total.toFixed(2)} €`);
+            setPaid(true);
+        } catch (err) {
+            alert(err.response?.data?.detail || 'Fehler beim Bezahlen');
+        }
+        loadBill();
+        loadGroupBill();
+    };
+
     const closeAndLeave = async () => {
         await API.put(`/session/${sessionId}/close`);
         localStorage.clear();
@@ -141,13 +207,25 @@ function Payment() {
                 <>
                     <div style={styles.billCard}>
                         <h3 style={styles.billTitle}>👥 Gruppen-Bestellungen</h3>
-                        {groupBill.items.map((item, i) => (
-                            <div key={i} style={styles.billItem}>
-                                <span>
-                                    <span style={styles.tableBadge}>T{item.table_number}</span>
-                                    {item.quantity}x {item.name}
-                                </span>
-                                <span>{item.subtotal.toFixed(2)} €</span>
+                        {groupBill.tables.map(table => (
+                            <div key={table.table_id} style={styles.groupTable}>
+                                <div style={styles.groupTableHeader}>
+                                    <span>
+                                        <span style={styles.tableBadge}>T{table.table_number}</span>
+                                        Tisch {table.table_number}
+                                    </span>
+                                    <span>{table.total.toFixed(2)} €</span>
+                                </div>
+                                {table.items.map((item, i) => (
+                                    <div key={i} style={styles.billItem}>
+                                        <span>{item.quantity}x {item.name}</span>
+                                        <span>{item.subtotal.toFixed(2)} €</span>
+                                    </div>
+                                ))}
+                                <div style={styles.groupTableFooter}>
+                                    <span>Bezahlt: {table.paid.toFixed(2)} €</span>
+                                    <span>Offen: {table.remaining.toFixed(2)} €</span>
+                                </div>
                             </div>
                         ))}
                         <div style={styles.billDivider}></div>
@@ -168,6 +246,45 @@ function Payment() {
                     <button onClick={payForGroup} style={styles.payGroupButton}>
                         💳 Für alle bezahlen ({groupBill.group_remaining.toFixed(2)} €)
                     </button>
+
+                    {/* Rechnung aufteilen */}
+                    <div style={{ ...styles.billCard, marginTop: '20px' }}>
+                        <h3 style={styles.billTitle}>✂️ Rechnung aufteilen</h3>
+                        <div style={styles.tabRow}>
+                            <button onClick={() => previewSplit('even')} style={splitMode === 'even' ? styles.activeTab : styles.tab}>
+                                Gleich
+                            </button>
+                            <button onClick={() => previewSplit('per_item')} style={splitMode === 'per_item' ? styles.activeTab : styles.tab}>
+                                Nach Artikeln
+                            </button>
+                            <button onClick={startCustomSplit} style={splitMode === 'custom' ? styles.activeTab : styles.tab}>
+                                Eigene Anteile
+                            </button>
+                        </div>
+                        {splitPreview && splitPreview.shares.map(share => (
+                            <div key={share.session_id} style={styles.billItem}>
+                                <span>
+                                    <span style={styles.tableBadge}>T{share.table_number}</span>
+                                    {share.session_id === sessionId ? 'Du' : `Tisch ${share.table_number}`}
+                                </span>
+                                {splitMode === 'custom' && (
+                                    <input
+                                        type="number"
+                                        min="0"
+                                        value={splitShares[share.session_id] ?? 0}
+                                        onChange={(e) => changeShare(share.session_id, e.target.value)}
+                                        style={styles.shareInput}
+                                    />
+                                )}
+                                <span>{share.amount.toFixed(2)} €</span>
+                            </div>
+                        ))}
+                        {splitPreview && (
+                            <button onClick={splitGroup} style={{ ...styles.payGroupButton, marginTop: '15px' }}>
+                                ✂️ Aufteilen und bezahlen ({splitPreview.total.toFixed(2)} €)
+                            </button>
+                        )}
+                    </div>
                 </>
             )}
 
@@ -189,8 +306,12 @@ const styles = {
     billRow: { display: 'flex', justifyContent: 'space-between', marginBottom: '8px', color: '#ccc' },
     billTotal: { display: 'flex', justifyContent: 'space-between', paddingTop: '10px', borderTop: '1px solid #333', color: '#e94560', fontWeight: 'bold', fontSize: '20px' },
     tableBadge: { background: '#333', color: '#888', padding: '2px 6px', borderRadius: '4px', fontSize: '11px', marginRight: '8px' },
+    groupTable: { marginBottom: '15px' },
+    groupTableHeader: { display: 'flex', justifyContent: 'space-between', padding: '8px 0', fontWeight: 'bold', borderBottom: '1px solid #333' },
+    groupTableFooter: { display: 'flex', justifyContent: 'space-between', padding: '6px 0', color: '#888', fontSize: '13px' },
     requestButton: { width: '100%', padding: '15px', background: '#1a1a2e', color: 'white', border: '1px solid #e94560', borderRadius: '10px', fontSize: '16px', cursor: 'pointer', marginBottom: '10px' },
     payButton: { width: '100%', padding: '15px', background: '#e94560', color: 'white', border: 'none', borderRadius: '10px', fontSize: '18px', cursor: 'pointer' },
+    shareInput: { width: '50px', padding: '4px', background: '#0f0f23', color: 'white', border: '1px solid #333', borderRadius: '4px' },
     payGroupButton: { width: '100%', padding: '15px', background: '#4CAF50', color: 'white', border: 'none', borderRadius: '10px', fontSize: '18px', cursor: 'pointer' },
     success: { textAlign: 'center', marginTop: '100px' },
     leaveButton: { marginTop: '20px', padding: '15px 40px', background: '#333', color: 'white', border: 'none', borderRadius: '10px', fontSize: '16px', cursor: 'pointer' },
@@ -16,6 +16,7 @@ function DashboardNav() {
 
     const links = [
         { path: '/dashboard', label: '📊 Dashboard' },
+        { path: '/dashboard/bar', label: '🍻 Theke' },
         { path: '/dashboard/tables', label: '🪑 Tische', adminOnly: true },
         { path: '/dashboard/menu', label: '📋 Menü', adminOnly: true },
         { path: '/dashboard/staff', label: '👥 Personal', adminOnly: true },
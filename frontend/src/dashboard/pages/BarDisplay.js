@@ -0,0 +1,153 @@
+import DashboardNav from '../components/DashboardNav';
+import React, { useEffect, useState } from 'react';
+import API from '../../api';
+
+// Gleiche Reihenfolge wie im Backend: Priorität, dann Alter
+const byPriority = (a, b) =>
+    a.priority - b.priority || (a.created_at < b.created_at ? -1 : a.created_at > b.created_at ? 1 : 0);
+
+function BarDisplay() {
+    const [orders, setOrders] = useState([]);
+    const [connected, setConnected] = useState(false);
+    const [selected, setSelected] = useState([]);
+    const restaurantId = localStorage.getItem('restaurant_id');
+
+    useEffect(() => {
+        // Ohne EventSource: alle 5 Sekunden abfragen
+        if (!window.EventSource) {
+            const loadQueue = async () => {
+                const res = await API.get(`/restaurant/${restaurantId}/bar/queue`);
+                setOrders(res.data);
+            };
+            loadQueue();
+            const interval = setInterval(loadQueue, 5000);
+            return () => clearInterval(interval);
+        }
+
+        // Nach einem Verbindungsabbruch verbindet sich EventSource selbst neu
+        // und bekommt wieder die komplette Liste ("queue")
+        const source = new EventSource(`${API.defaults.baseURL}/restaurant/${restaurantId}/bar/stream`);
+        source.onopen = () => setConnected(true);
+        source.onerror = () => setConnected(false);
+        source.addEventListener('queue', (e) => {
+            setOrders(JSON.parse(e.data));
+        });
+        source.addEventListener('order', (e) => {
+            const order = JSON.parse(e.data);
+            setOrders(prev => {
+                const rest = prev.filter(o => o.order_id !== order.order_id);
+                return order.status === 'delivered' ? rest : [...rest, order].sort(byPriority);
+            });
+        });
+        return () => source.close();
+    }, [restaurantId]);
+
+    const updateOrderStatus = async (orderId, status) => {
+        await API.put(`/order/${orderId}/status/${status}`);
+    };
+
+    const toggleSelected = (orderId) => {
+        setSelected(prev => prev.includes(orderId) ? prev.filter(id => id !== orderId) : [...prev, orderId]);
+    };
+
+    // Ganzes Tablett mit einer Anfrage weiterschalten
+    const updateSelected = async (status) => {
+        await API.put(`/restaurant/${restaurantId}/orders/status`, { status, order_ids: selected });
+        setSelected([]);
+    };
+
+    return (
+        <>
+            <DashboardNav />
+            <div style={styles.container}>
+                <div style={styles.header}>
+                    <h1 style={styles.title}>🍻 Theke ({orders.length})</h1>
+                    <span style={{ color: connected ? '#4CAF50' : '#888' }}>
+                        {connected ? '● Live' : '○ Verbinde...'}
+                    </span>
+                </div>
+
+                {selected.length > 0 && (
+                    <div style={styles.bulkBar}>
+                        <button onClick={() => updateSelected('preparing')} style={styles.prepareButton}>
+                            👨‍🍳 {selected.length} zubereiten
+                        </button>
+                        <button onClick={() => updateSelected('delivered')} style={styles.deliverButton}>
+                            ✅ {selected.length} geliefert
+                        </button>
+                    </div>
+                )}
+
+                <div style={styles.content}>
+                    {orders.length === 0 ? (
+                        <p style={styles.empty}>Keine offenen Bestellungen</p>
+                    ) : (
+                        orders.map(order => (
+                            <div key={order.order_id} style={{
+                                ...styles.orderCard,
+                                borderLeft: `4px solid ${order.source === 'auto_order' ? '#e94560' : order.status === 'preparing' ? '#ff9800' : '#333'}`
+                            }}>
+                                <div style={styles.orderHeader}>
+                                    <label>
+                                        <input
+                                            type="checkbox"
+                                            checked={selected.includes(order.order_id)}
+                                            onChange={() => toggleSelected(order.order_id)}
+                                        />
+                                        {' '}🪑 Tisch {order.table_number}
+                                    </label>
+                                    <span style={styles.orderTotal}>{order.total.toFixed(2)} €</span>
+                                </div>
+                                {order.items.map((item, i) => (
+                                    <p key={i} style={styles.orderItem}>{item.quantity}x {item.name}</p>
+                                ))}
+                                {order.source === 'auto_order' && (
+                                    <p style={styles.orderTime}>🍺 Glas leer – Auto-Bestellung</p>
+                                )}
+                                {order.source === 'auto_prequeue' && (
+                                    <p style={styles.orderTime}>
+                                        ⏱ Vorbestellung{order.predicted_empty_at
+                                            ? ` – Glas leer ca. ${new Date(order.predicted_empty_at * 1000).toLocaleTimeString()}`
+                                            : ''}
+                                    </p>
+                                )}
+                                <p style={styles.orderTime}>{order.created_at}</p>
+                                <div style={styles.buttonRow}>
+                                    {order.status === 'pending' && (
+                                        <button onClick={() => updateOrderStatus(order.order_id, 'preparing')} style={styles.prepareButton}>
+                                            👨‍🍳 Zubereiten
+                                        </button>
+                                    )}
+                                    {order.status === 'preparing' && (
+                                        <button onClick={() => updateOrderStatus(order.order_id, 'delivered')} style={styles.deliverButton}>
+                                            ✅ Geliefert
+                                        </button>
+                                    )}
+                                </div>
+                            </div>
+                        ))
+                    )}
+                </div>
+            </div>
+        </>
+    );
+}
+
+const styles = {
+    container: { background: '#0f0f23', minHeight: '100vh', color: 'white' },
+    header: { display: 'flex', justifyContent: 'space-between', alignItems: 'center', padding: '15px 20px', borderBottom: '1px solid #333' },
+    title: { margin: 0, fontSize: '20px' },
+    content: { padding: '20px' },
+    bulkBar: { display: 'flex', gap: '10px', padding: '10px 20px', borderBottom: '1px solid #333' },
+    orderCard: { background: '#1a1a2e', padding: '15px', borderRadius: '10px', marginBottom: '10px' },
+    orderHeader: { display: 'flex', justifyContent: 'space-between', marginBottom: '10px' },
+    orderTotal: { color: '#e94560', fontWeight: 'bold' },
+    orderItem: { margin: '5px 0', color: '#ccc', fontSize: '18px' },
+    orderTime: { color: '#666', fontSize: '12px' },
+    buttonRow: { display: 'flex', gap: '10px', marginTop: '10px' },
+    prepareButton: { flex: 1, padding: '10px', background: '#ff9800', color: 'white', border: 'none', borderRadius: '8px', cursor: 'pointer' },
+    deliverButton: { flex: 1, padding: '10px', background: '#4CAF50', color: 'white', border: 'none', borderRadius: '8px', cursor: 'pointer' },
+    empty: { color: '#888', textAlign: 'center', marginTop: '50px' }
+};
+
+export default BarDisplay;
@@ -1,5 +1,5 @@
 import DashboardNav from '../components/DashboardNav';
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import API from '../../api';
 
@@ -13,51 +13,105 @@ function Dashboard() {
     const restaurantId = localStorage.getItem('restaurant_id');
     const navigate = useNavigate();
 
+    const [live, setLive] = useState(false);
+    const snapshotEtag = useRef(null);
+
+    const applySnapshot = (data) => {
+        setDashboard({ restaurant: data.restaurant, tables: data.tables });
+        setOrders(data.orders);
+        setServiceRequests(data.service_requests);
+        setPaymentRequests(data.payment_requests);
+        setBierdeckel(data.bierdeckel);
+    };
+
     useEffect(() => {
-        loadAll();
-        const interval = setInterval(loadAll, 5000);
-        return () => clearInterval(interval);
-    }, []);
+        // Ohne EventSource: alle 5 Sekunden den Gesamtstand abfragen
+        if (!window.EventSource) {
+            loadAll();
+            const interval = setInterval(loadAll, 5000);
+            return () => clearInterval(interval);
+        }
+
+        // Erst der komplette Stand ("snapshot"), danach nur Änderungen.
+        // Nach einem Abbruch verbindet sich EventSource neu und bekommt wieder alles.
+        const source = new EventSource(`${API.defaults.baseURL}/restaurant/${restaurantId}/events`);
+        source.onopen = () => setLive(true);
+        source.onerror = () => setLive(false);
+        source.addEventListener('snapshot', (e) => {
+            applySnapshot(JSON.parse(e.data));
+        });
+        source.addEventListener('order', (e) => {
+            const order = JSON.parse(e.data);
+            setOrders(prev => {
+                const rest = prev.filter(o => o.order_id !== order.order_id);
+                return order.status === 'delivered' ? rest : [...rest, order];
+            });
+        });
+        source.addEventListener('tables', (e) => {
+            const changed = JSON.parse(e.data);
+            setDashboard(prev => prev && {
+                ...prev,
+                tables: prev.tables.map(t => changed.find(c => c.table_id === t.table_id) || t)
+            });
+        });
+        source.addEventListener('service_requests', (e) => {
+            setServiceRequests(JSON.parse(e.data));
+        });
+        source.addEventListener('payment_requests', (e) => {
+            setPaymentRequests(JSON.parse(e.data));
+        });
+        source.addEventListener('coaster', (e) => {
+            const coaster = JSON.parse(e.data);
+            setBierdeckel(prev => prev.map(b => b.bierdeckel_id === coaster.bierdeckel_id ? coaster : b));
+        });
+        return () => source.close();
+    }, [restaurantId]);
 
+    // Alles in einer Anfrage; unverändert seit dem letzten Abruf -> 304 ohne Inhalt
     const loadAll = async () => {
         try {
-            const [dashRes, orderRes, serviceRes, paymentRes, bierdeckelRes] = await Promise.all([
-                API.get(`/restaurant/${restaurantId}/dashboard`),
-                API.get(`/restaurant/${restaurantId}/orders`),
-                API.get(`/restaurant/${restaurantId}/service-requests`),
-                API.get(`/restaurant/${restaurantId}/payment-requests`),
-                API.get(`/restaurant/${restaurantId}/bierdeckel`)
-            ]);
-            setDashboard(dashRes.data);
-            setOrders(orderRes.data);
-            setServiceRequests(serviceRes.data);
-            setPaymentRequests(paymentRes.data);
-            setBierdeckel(bierdeckelRes.data);
+            const res = await API.get(`/restaurant/${restaurantId}/snapshot`, {
+                headers: snapshotEtag.current ? { 'If-None-Match': snapshotEtag.current } : {},
+                validateStatus: (status) => status === 200 || status === 304
+            });
+            if (res.status === 304) {
+                return;
+            }
+            snapshotEtag.current = res.headers.etag;
+            applySnapshot(res.data);
         } catch (err) {
             console.error(err);
         }
     };
 
+    // Mit Stream kommen Änderungen von selbst, sonst neu laden. Der Server
+    // sammelt Änderungen kurz, bevor sich das ETag ändert, daher etwas warten.
+    const refresh = () => {
+        if (!live) {
+            setTimeout(loadAll, 500);
+        }
+    };
+
     const closeSession = async (sessionId) => {
         if (window.confirm('Session wirklich schließen?')) {
             await API.put(`/session/${sessionId}/close`);
-            loadAll();
+            refresh();
         }   
     };
 
     const confirmPayment = async (paymentId) => {
         await API.put(`/payment/${paymentId}/confirm`);
-        loadAll();
+        refresh();
     };
 
     const updateOrderStatus = async (orderId, status) => {
         await API.put(`/order/${orderId}/status/${status}`);
-        loadAll();
+        refresh();
     };
 
     const updateServiceStatus = async (requestId, status) => {
         await API.put(`/service-request/${requestId}/status/${status}`);
-        loadAll();
+        refresh();
     };
 
     const logout = () => {
@@ -86,6 +140,11 @@ function Dashboard() {
             <div style={styles.container}>
                 <div style={styles.header}>
                     <h1 style={styles.title}>🍺 {dashboard?.restaurant || 'Dashboard'}</h1>
+                    {window.EventSource && (
+                        <span style={{ color: live ? '#4CAF50' : '#888' }}>
+                            {live ? '● Live' : '○ Verbinde...'}
+                        </span>
+                    )}
                 </div>
 
                 <div style={styles.tabs}>
@@ -146,6 +205,13 @@ function Dashboard() {
                                         {order.items.map((item, i) => (
                                             <p key={i} style={styles.orderItem}>{item.quantity}x {item.name}</p>
                                         ))}
+                                        {order.source === 'auto_prequeue' && (
+                                            <p style={styles.orderTime}>
+                                                ⏱ Vorbestellung{order.predicted_empty_at
+                                                    ? ` – Glas leer ca. ${new Date(order.predicted_empty_at * 1000).toLocaleTimeString()}`
+                                                    : ''}
+                                            </p>
+                                        )}
                                         <p style={styles.orderTime}>{order.created_at}</p>
                                         <div style={styles.buttonRow}>
                                             {order.status === 'pending' && (
@@ -170,21 +236,28 @@ function Dashboard() {
                             {serviceRequests.length === 0 ? (
                                 <p style={styles.empty}>Keine offenen Anfragen</p>
                             ) : (
+                                // Reihenfolge kommt vom Server: überfällige zuerst, dann Zahlen/Servicekraft, dann Alter
                                 serviceRequests.map(req => (
-                                    <div key={req.request_id} style={styles.orderCard}>
+                                    <div key={req.request_id} style={req.escalated ? { ...styles.orderCard, ...styles.overdueCard } : styles.orderCard}>
                                         <div style={styles.orderHeader}>
                                             <span>🪑 Tisch {req.table_number}</span>
-                                            <span style={{ color: '#ff9800' }}>{req.request_type}</span>
+                                            <span style={{ color: '#ff9800' }}>{req.escalated && '⏰ überfällig · '}{req.request_type}</span>
                                         </div>
                                         {req.message && <p style={styles.orderItem}>{req.message}</p>}
                                         <p style={styles.orderTime}>{req.created_at}</p>
                                         <div style={styles.buttonRow}>
-                                            {req.status === 'open' && (
+                                            {/* Zahlungswunsch: wird mit der Zahlung erledigt */}
+                                            {req.request_type === 'payment' && (
+                                                <button onClick={() => confirmPayment(req.payment_id)} style={styles.deliverButton}>
+                                                    ✅ Als bezahlt bestätigen
+                                                </button>
+                                            )}
+                                            {req.request_type !== 'payment' && req.status === 'open' && (
                                                 <button onClick={() => updateServiceStatus(req.request_id, 'in_progress')} style={styles.prepareButton}>
                                                     🏃 In Bearbeitung
                                                 </button>
                                             )}
-                                            {req.status === 'in_progress' && (
+                                            {req.request_type !== 'payment' && req.status === 'in_progress' && (
                                                 <button onClick={() => updateServiceStatus(req.request_id, 'done')} style={styles.deliverButton}>
                                                     ✅ Erledigt
                                                 </button>
@@ -226,7 +299,7 @@ function Dashboard() {
                                 <p style={styles.empty}>Keine Bierdeckel-Daten</p>
                             ) : (
                                 bierdeckel.map(b => (
-                                    <div key={b.table_id} style={styles.bierdeckelCard}>
+                                    <div key={b.bierdeckel_id} style={styles.bierdeckelCard}>
                                         <h3>Tisch {b.table_number}</h3>
                                         <div style={{
                                             ...styles.statusDot,
@@ -265,6 +338,7 @@ const styles = {
     orderTotal: { color: '#e94560', fontWeight: 'bold' },
     orderItem: { margin: '5px 0', color: '#ccc' },
     orderTime: { color: '#666', fontSize: '12px' },
+    overdueCard: { border: '2px solid #f44336' },
     buttonRow: { display: 'flex', gap: '10px', marginTop: '10px' },
     prepareButton: { flex: 1, padding: '10px', background: '#ff9800', color: 'white', border: 'none', borderRadius: '8px', cursor: 'pointer' },
     deliverButton: { flex: 1, padding: '10px', background: '#4CAF50', color: 'white', border: 'none', borderRadius: '8px', cursor: 'pointer' },
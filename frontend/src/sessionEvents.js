@@ -0,0 +1,45 @@
+import API from './api';
+
+// Eine EventSource pro Session für alle Seiten des Gasts (Navbar, Bestellungen,
+// Zusammen trinken, Spiel). Die Seiten melden sich mit ihren Handlern an.
+const EVENTS = ['session', 'order', 'invitation', 'invitation_answered', 'group', 'game'];
+
+let source = null;
+let sourceSession = null;
+const listeners = new Set();
+
+const dispatch = (name, data) => {
+    listeners.forEach(handlers => handlers[name] && handlers[name](data));
+};
+
+const connect = (sessionId) => {
+    source = new EventSource(`${API.defaults.baseURL}/session/${sessionId}/events`);
+    sourceSession = sessionId;
+    // Nach jedem (Neu-)Verbinden laden die Seiten ihren Stand, verpasste Ereignisse gehen so nicht verloren
+    source.onopen = () => dispatch('open');
+    // Endgültig geschlossen (z.B. 404): Seiten prüfen die Session selbst
+    source.onerror = () => {
+        if (source && source.readyState === EventSource.CLOSED) dispatch('closed');
+    };
+    EVENTS.forEach(name => source.addEventListener(name, (e) => dispatch(name, JSON.parse(e.data))));
+};
+
+// handlers: { order: fn, game: fn, open: fn, ... }. Gibt die Abmeldefunktion
+// zurück oder null, wenn der Browser keine EventSource kennt (dann weiter abfragen).
+export const subscribeSession = (sessionId, handlers) => {
+    if (!window.EventSource || !sessionId) return null;
+    if (source && sourceSession !== sessionId) {
+        source.close();
+        source = null;
+    }
+    if (!source) connect(sessionId);
+
+    listeners.add(handlers);
+    return () => {
+        listeners.delete(handlers);
+        if (listeners.size === 0 && source) {
+            source.close();
+            source = null;
+        }
+    };
+};